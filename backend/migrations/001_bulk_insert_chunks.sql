@@ -0,0 +1,21 @@
+-- Insert many chunks in one round-trip from the Supabase REST client:
+--   supabase.rpc("bulk_insert_chunks", {"rows": [{...}, ...]})
+-- Each row is a JSON object keyed by column name; jsonb_populate_recordset casts
+-- the values to the chunks table's own column types (embedding literals to vector).
+-- Targets the default "chunks" table; adjust if SUPABASE_TABLE is overridden.
+
+create or replace function bulk_insert_chunks(rows jsonb)
+returns integer
+language plpgsql
+as $$
+declare
+  inserted integer;
+begin
+  insert into chunks (id, "fileId", position, "originalName", content, "downloadUrl", embedding)
+  select id, "fileId", position, "originalName", content, "downloadUrl", embedding
+  from jsonb_populate_recordset(null::chunks, rows);
+
+  get diagnostics inserted = row_count;
+  return inserted;
+end;
+$$;
@@ -0,0 +1,26 @@
+-- Insert a file's metadata row and all of its chunks in one round-trip and one transaction:
+--   supabase.rpc("insert_document_with_chunks", {"file_meta": {...}, "chunks": [{...}, ...]})
+-- file_meta is keyed by "files" column name; chunk rows are keyed by "chunks" column
+-- name and their "fileId" is set here to the id of the inserted file.
+-- If any chunk fails to insert, the file row is rolled back with it.
+-- Targets the default "chunks" table; adjust if SUPABASE_TABLE is overridden.
+
+create or replace function insert_document_with_chunks(file_meta jsonb, chunks jsonb)
+returns text
+language plpgsql
+as $$
+declare
+  new_file_id files.id%type;
+begin
+  insert into files (title, link, license, in_database)
+  select title, link, license, in_database
+  from jsonb_populate_record(null::files, file_meta)
+  returning id into new_file_id;
+
+  insert into chunks (id, "fileId", position, "originalName", content, "downloadUrl", embedding)
+  select id, new_file_id, position, "originalName", content, "downloadUrl", embedding
+  from jsonb_populate_recordset(null::chunks, chunks);
+
+  return new_file_id::text;
+end;
+$$;
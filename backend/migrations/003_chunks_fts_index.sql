@@ -0,0 +1,14 @@
+-- Keep a precomputed tsvector of each chunk's content and index it, so the
+-- full-text half of hybrid_search is a GIN lookup instead of tokenizing every
+-- chunk per query. Inserts need no change: Postgres fills the generated column.
+-- No-ops where the column or index already exists.
+-- hybrid_search should then filter with
+--   fts @@ websearch_to_tsquery('english', query_text)   (or plainto_tsquery)
+-- and rank with ts_rank_cd(fts, ...), rather than calling to_tsvector(content).
+-- Targets the default "chunks" table; adjust if SUPABASE_TABLE is overridden.
+
+alter table chunks
+  add column if not exists fts tsvector
+  generated always as (to_tsvector('english', content)) stored;
+
+create index if not exists chunks_fts_idx on chunks using gin (fts);
@@ -0,0 +1,13 @@
+-- Let Postgres generate file IDs so clients no longer send one with each insert.
+-- Works whether files.id is a uuid or a text column.
+
+do $$
+begin
+  if (select data_type from information_schema.columns
+      where table_name = 'files' and column_name = 'id') = 'uuid' then
+    alter table files alter column id set default gen_random_uuid();
+  else
+    alter table files alter column id set default gen_random_uuid()::text;
+  end if;
+end;
+$$;
@@ -0,0 +1,28 @@
+-- Store chunk embeddings as half-precision halfvec(768) (pgvector >= 0.7.0):
+-- half the storage and index size of vector(768), and faster HNSW distance math.
+-- The client already sends values rounded to float16, so no precision is lost
+-- relative to what is inserted.
+-- Indexes on the old column type cannot be converted, so they are dropped and
+-- an HNSW cosine index is built on the new type.
+-- hybrid_search keeps its vector(768) parameter; compare against the column with
+--   embedding <=> query_embedding::halfvec(768)
+-- Targets the default "chunks" table; adjust if SUPABASE_TABLE is overridden.
+
+do $$
+declare
+  idx record;
+begin
+  for idx in
+    select indexname from pg_indexes
+    where tablename = 'chunks' and indexdef ilike '%(embedding %'
+  loop
+    execute format('drop index %I', idx.indexname);
+  end loop;
+end;
+$$;
+
+alter table chunks
+  alter column embedding type halfvec(768) using embedding::halfvec(768);
+
+create index if not exists chunks_embedding_hnsw_idx
+  on chunks using hnsw (embedding halfvec_cosine_ops);
@@ -0,0 +1,84 @@
+-- Scope hybrid_search by file ID: chunks."fileId" gets a btree index, and the
+-- function takes an optional file_id matched against it. Works whether the
+-- file ID columns are uuid or text (see 004). Existing callers are
+-- unaffected: file_title still filters on the title in the files table, and
+-- rows are still whole chunks rows.
+-- The full-text and semantic rankings read the stored fts column (003) and
+-- compare against the halfvec embedding column (005).
+-- Targets the default "chunks" table; adjust if SUPABASE_TABLE is overridden.
+
+create index if not exists chunks_file_id_idx on chunks ("fileId");
+
+-- Drop every existing overload so PostgREST resolves the call unambiguously
+do $$
+declare
+  fn record;
+begin
+  for fn in select oid::regprocedure as signature from pg_proc where proname = 'hybrid_search'
+  loop
+    execute 'drop function ' || fn.signature;
+  end loop;
+end;
+$$;
+
+create function hybrid_search(
+  query_text text,
+  query_embedding vector(768),
+  match_count int,
+  full_text_weight float = 1,
+  semantic_weight float = 1,
+  rrf_k int = 60,
+  file_title text = '',
+  file_id text = null
+)
+returns setof chunks
+language plpgsql
+as $$
+declare
+  -- Only the filters in use are added, and the query is planned with them, so
+  -- a file_id lookup goes through chunks_file_id_idx instead of an OR'd predicate
+  scope text := '';
+begin
+  if file_id is not null then
+    -- file_id arrives as text so it works whether "fileId" is a uuid or a text
+    -- column (see 004); the parameter is cast to the column's type, not the
+    -- other way round, so the index still applies
+    select scope || format(' and c."fileId" = $8::%s', format_type(a.atttypid, a.atttypmod))
+    into scope
+    from pg_attribute a
+    where a.attrelid = 'chunks'::regclass and a.attname = 'fileId';
+  end if;
+  if file_title <> '' then
+    scope := scope || ' and exists (select 1 from files f where f.id = c."fileId" and f.title = $7)';
+  end if;
+
+  return query execute format($query$
+    with full_text as (
+      select c.id,
+        row_number() over (order by ts_rank_cd(c.fts, websearch_to_tsquery('english', $1)) desc) as rank_ix
+      from chunks c
+      where c.fts @@ websearch_to_tsquery('english', $1) %1$s
+      order by rank_ix
+      limit least($3, 30) * 2
+    ),
+    semantic as (
+      select c.id,
+        row_number() over (order by c.embedding <=> $2::halfvec(768)) as rank_ix
+      from chunks c
+      where true %1$s
+      order by rank_ix
+      limit least($3, 30) * 2
+    )
+    select c.*
+    from full_text
+    full outer join semantic on full_text.id = semantic.id
+    join chunks c on c.id = coalesce(full_text.id, semantic.id)
+    order by
+      coalesce(1.0 / ($6 + full_text.rank_ix), 0.0) * $4 +
+      coalesce(1.0 / ($6 + semantic.rank_ix), 0.0) * $5
+      desc
+    limit least($3, 30)
+  $query$, scope)
+  using query_text, query_embedding, match_count, full_text_weight, semantic_weight, rrf_k, file_title, file_id;
+end;
+$$;
@@ -0,0 +1,43 @@
+from concurrent.futures import ProcessPoolExecutor
+from fastapi import Request
+from src.infrastructure.cache.response_cache import ExactResponseCache
+from src.infrastructure.cache.semantic_cache import SemanticCache
+from src.infrastructure.cache.processed_document_cache import ProcessedDocumentCache
+from src.infrastructure.document_processing.pdf_processor import LangChainDocumentProcessor
+from src.infrastructure.rag.query_processor import LangChainRAGChain
+from src.infrastructure.uploads.session_store import UploadSessionStore
+from src.infrastructure.vector_store.supabase_store import LangChainVectorStore
+
+# Shared components are built once per worker in the app lifespan (see src/main.py)
+
+def get_vector_store(request: Request) -> LangChainVectorStore:
+    """Return the app-wide vector store."""
+    return request.app.state.vector_store
+
+def get_document_processor(request: Request) -> LangChainDocumentProcessor:
+    """Return the app-wide document processor."""
+    return request.app.state.document_processor
+
+def get_pdf_pool(request: Request) -> ProcessPoolExecutor:
+    """Return the app-wide process pool used for PDF parsing."""
+    return request.app.state.pdf_pool
+
+def get_rag_chain(request: Request) -> LangChainRAGChain:
+    """Return the app-wide RAG chain."""
+    return request.app.state.rag_chain
+
+def get_response_cache(request: Request) -> ExactResponseCache:
+    """Return the app-wide exact-match response cache."""
+    return request.app.state.response_cache
+
+def get_semantic_cache(request: Request) -> SemanticCache:
+    """Return the app-wide semantic response cache."""
+    return request.app.state.semantic_cache
+
+def get_processed_cache(request: Request) -> ProcessedDocumentCache:
+    """Return the app-wide cache of processed document chunks and embeddings."""
+    return request.app.state.processed_cache
+
+def get_upload_sessions(request: Request) -> UploadSessionStore:
+    """Return the app-wide chunked upload session store."""
+    return request.app.state.upload_sessions
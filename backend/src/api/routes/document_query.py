@@ -1,154 +1,192 @@
-from fastapi import APIRouter
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Depends
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
-from typing import Optional, List, Dict, Any
+from typing import Callable, Optional, List, Dict, Any
 from src.core.app_settings import settings
 from src.core.error_handlers import QueryProcessingError
 from src.infrastructure.rag.query_processor import LangChainRAGChain
-from src.infrastructure.vector_store.supabase_store import LangChainVectorStore
+from src.infrastructure.cache.semantic_cache import SemanticCache
+from src.infrastructure.cache.response_cache import ExactResponseCache
+from src.api.dependencies import get_rag_chain, get_response_cache, get_semantic_cache
+from langchain_core.documents import Document
+import asyncio
 import logging
 import traceback
 import uuid
 
 # Set up logger
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)  # Set to DEBUG for maximum verbosity
+logger.setLevel(settings.LOG_LEVEL)
 
 router = APIRouter()
 
-# Initialize components
-try:
-    logger.info("Initializing vector store for query processing")
-    vector_store = LangChainVectorStore(
-        supabase_url=settings.SUPABASE_URL,
-        supabase_key=settings.SUPABASE_KEY,
-        gemini_api_key=settings.GEMINI_API_KEY,
-        table_name=settings.SUPABASE_TABLE
-    )
-    logger.info("Vector store initialized successfully")
-except Exception as e:
-    logger.error(f"Failed to initialize vector store: {str(e)}")
-    logger.error(traceback.format_exc())
-    raise
-
-try:
-    logger.info(f"Initializing RAG chain with model: {settings.GENERATION_MODEL}")
-    rag_chain = LangChainRAGChain(
-        vector_store=vector_store,
-        gemini_api_key=settings.GEMINI_API_KEY,
-        model_name=settings.GENERATION_MODEL
-    )
-    logger.info("RAG chain initialized successfully")
-except Exception as e:
-    logger.error(f"Failed to initialize RAG chain: {str(e)}")
-    logger.error(traceback.format_exc())
-    raise
-
 class QueryRequest(BaseModel):
     """Request model for document queries."""
     query: str
     file_title: Optional[str] = None
+    file_id: Optional[str] = None  # Preferred over file_title: filters on the indexed fileId column
+    conversation_history: Optional[List[Dict[str, str]]] = None  # [{"role": "user"|"assistant", "content": ...}]
+    include_chunks: bool = False  # Return the source chunks alongside the answer
+
+def format_sources(request_id: str, documents: List[Document], sign_url: Callable[[str], str]) -> List[Dict[str, Any]]:
+    """Format retrieved source documents for the response, signing their download URLs."""
+    sources = []
+    for i, doc in enumerate(documents):
+        try:
+            sources.append({
+                "id": doc.metadata.get("id", f"unknown_{i}"),
+                "fileId": doc.metadata.get("fileId", "unknown"),
+                "position": doc.metadata.get("position", i),
+                "extractedText": doc.page_content,
+                "originalName": doc.metadata.get("originalName", "unknown"),
+                "downloadUrl": sign_url(doc.metadata.get("downloadUrl", ""))
+            })
+        except Exception as e:
+            logger.warning("[%s] Error formatting source document %s: %s", request_id, i, e)
+    return sources
+
+def build_response(
+    request_id: str,
+    result: Dict[str, Any],
+    include_chunks: bool,
+    sign_url: Callable[[str], str]
+) -> ORJSONResponse:
+    """Build the query response, formatting source chunks only when the client asked for them."""
+    payload: Dict[str, Any] = {"answer": result["answer"]}
+    if include_chunks:
+        payload["chunks"] = format_sources(request_id, result["source_documents"], sign_url)
+    return ORJSONResponse(content=payload)
 
 @router.post("/query_document/")
-async def query_document(request: QueryRequest):
+async def query_document(
+    request: QueryRequest,
+    rag_chain: LangChainRAGChain = Depends(get_rag_chain),
+    response_cache: ExactResponseCache = Depends(get_response_cache),
+    semantic_cache: SemanticCache = Depends(get_semantic_cache)
+):
     """
     Query the RAG pipeline with a question and optional file title.
     
     Conversation history is automatically maintained by the RAG chain's memory system,
     allowing for contextual follow-up questions without explicit history management.
+    Clients that keep their own history can send it as conversation_history instead.
     """
     request_id = uuid.uuid4().hex[:8]  # Generate a unique ID for this request
-    logger.info(f"[{request_id}] Processing query: '{request.query}'")
-    logger.debug(f"[{request_id}] File title filter: {request.file_title or 'None'}")
+    logger.info("[%s] Processing query: '%s'", request_id, request.query)
+    logger.debug("[%s] File title filter: %s", request_id, request.file_title or 'None')
     
     try:
         # Extract file_title - if it's None or empty string, set to None
         file_title = request.file_title if request.file_title else None
         
+        # Check the exact-match cache, then the semantic cache for a near-duplicate question
+        # Answers depend on the supplied history, so client-managed history bypasses the caches
+        # The caches are scoped by file title, so queries scoped by file ID bypass them too
+        use_cache = settings.CACHE_ENABLED and request.conversation_history is None and request.file_id is None
+        
+        query_embedding = None
+        if use_cache:
+            cached = await response_cache.get(request.query, file_title)
+            if cached is not None:
+                logger.info("[%s] Exact cache hit", request_id)
+                rag_chain.memory.save_context(
+                    {"question": request.query},
+                    {"answer": cached["answer"]}
+                )
+                return build_response(request_id, cached, request.include_chunks, rag_chain.vector_store.signed_url_for)
+        
+        # A near-duplicate question can mean something else as a follow-up, so the
+        # semantic cache only serves, and only learns from, the first question of a conversation
+        use_semantic_cache = use_cache and not rag_chain.memory.chat_memory.messages
+        if use_semantic_cache:
+            query_embedding = await asyncio.to_thread(rag_chain.embed_query, request.query)
+            cached = semantic_cache.lookup(query_embedding, file_title)
+            if cached is not None:
+                logger.info("[%s] Semantic cache hit", request_id)
+                # Keep the conversation memory consistent with what the user sees
+                rag_chain.memory.save_context(
+                    {"question": request.query},
+                    {"answer": cached["answer"]}
+                )
+                return build_response(request_id, cached, request.include_chunks, rag_chain.vector_store.signed_url_for)
+        
         # Log vector store retrieval attempt
-        logger.debug(f"[{request_id}] Performing vector store retrieval")
+        logger.debug("[%s] Performing vector store retrieval", request_id)
         
         # Query the RAG chain (conversation history is handled internally)
-        response = rag_chain.query(
+        if query_embedding is None:
+            query_embedding = await asyncio.to_thread(rag_chain.embed_query, request.query)
+        response = await rag_chain.aquery(
             question=request.query,
-            file_title=file_title
+            query_embedding=query_embedding,
+            file_title=file_title,
+            conversation_history=request.conversation_history,
+            file_id=request.file_id
         )
         
         # Log successful retrieval
         source_count = len(response["source_documents"]) if "source_documents" in response else 0
-        logger.info(f"[{request_id}] Query processed successfully. Found {source_count} source documents")
+        logger.info("[%s] Query processed successfully. Found %s source documents", request_id, source_count)
         
-        # Format source documents for response
-        sources = []
-        if "source_documents" in response and response["source_documents"]:
-            for i, doc in enumerate(response["source_documents"]):
-                try:
-                    source = {
-                        "id": doc.metadata.get("id", f"unknown_{i}"),
-                        "fileId": doc.metadata.get("fileId", "unknown"),
-                        "position": doc.metadata.get("position", i),
-                        "extractedText": doc.page_content,
-                        "originalName": doc.metadata.get("originalName", "unknown"),
-                        "downloadUrl": doc.metadata.get("downloadUrl", "")
-                    }
-                    sources.append(source)
-                except Exception as e:
-                    logger.warning(f"[{request_id}] Error formatting source document {i}: {str(e)}")
-        
-        # Return formatted response
-        return JSONResponse(content={
+        # Cache the raw source documents; they are only formatted when a client asks for chunks
+        result = {
             "answer": response.get("answer", "No answer generated"),
-            "chunks": sources
-        })
+            "source_documents": response.get("source_documents") or []
+        }
+        if use_cache:
+            await response_cache.set(request.query, result, file_title)
+        if use_semantic_cache:
+            semantic_cache.add(query_embedding, result, file_title)
+        
+        return build_response(request_id, result, request.include_chunks, rag_chain.vector_store.signed_url_for)
     except Exception as e:
-        logger.error(f"[{request_id}] Error processing query: {str(e)}")
+        logger.error("[%s] Error processing query: %s", request_id, e)
         logger.error(traceback.format_exc())
         raise QueryProcessingError(str(e))
 
 @router.get("/chat-history")
-async def get_chat_history():
+async def get_chat_history(rag_chain: LangChainRAGChain = Depends(get_rag_chain)):
     """
     Retrieve the conversation history from the RAG chain's memory.
     """
     request_id = uuid.uuid4().hex[:8]
-    logger.info(f"[{request_id}] Retrieving chat history")
+    logger.info("[%s] Retrieving chat history", request_id)
     
     try:
-        # Convert the conversation history to a list of messages
-        history = []
-        if hasattr(rag_chain, 'memory') and hasattr(rag_chain.memory, 'chat_memory'):
-            for message in rag_chain.memory.chat_memory.messages:
-                if hasattr(message, 'type') and hasattr(message, 'content'):
-                    role = 'assistant' if message.type == 'ai' else 'user'
-                    history.append({"role": role, "content": message.content})
-            
-            logger.info(f"[{request_id}] Retrieved {len(history)} messages from chat history")
-        else:
-            logger.warning(f"[{request_id}] No chat memory found in RAG chain")
-        
+        # The memory keeps a serialized copy of the history, updated on every save
+        history = rag_chain.memory.serialized
+        logger.info("[%s] Retrieved %s messages from chat history", request_id, len(history))
         return history
     except Exception as e:
-        logger.error(f"[{request_id}] Failed to retrieve chat history: {str(e)}")
+        logger.error("[%s] Failed to retrieve chat history: %s", request_id, e)
         logger.error(traceback.format_exc())
         raise QueryProcessingError(f"Failed to retrieve chat history: {str(e)}")
 
 @router.delete("/chat-history")
-async def clear_chat_history():
+async def clear_chat_history(
+    rag_chain: LangChainRAGChain = Depends(get_rag_chain),
+    response_cache: ExactResponseCache = Depends(get_response_cache),
+    semantic_cache: SemanticCache = Depends(get_semantic_cache)
+):
     """
     Clear the conversation history from the RAG chain's memory.
     """
     request_id = uuid.uuid4().hex[:8]
-    logger.info(f"[{request_id}] Clearing chat history")
+    logger.info("[%s] Clearing chat history", request_id)
     
     try:
         if hasattr(rag_chain, 'memory') and hasattr(rag_chain.memory, 'clear'):
             rag_chain.memory.clear()
-            logger.info(f"[{request_id}] Chat history cleared successfully")
+            logger.info("[%s] Chat history cleared successfully", request_id)
         else:
-            logger.warning(f"[{request_id}] No chat memory found to clear")
+            logger.warning("[%s] No chat memory found to clear", request_id)
+        
+        # Cached answers were produced alongside the cleared conversation
+        await response_cache.clear()
+        semantic_cache.clear()
             
         return {"message": "Chat history cleared successfully"}
     except Exception as e:
-        logger.error(f"[{request_id}] Failed to clear chat history: {str(e)}")
+        logger.error("[%s] Failed to clear chat history: %s", request_id, e)
         logger.error(traceback.format_exc())
         raise QueryProcessingError(f"Failed to clear chat history: {str(e)}") 
\ No newline at end of file
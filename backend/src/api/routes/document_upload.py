@@ -1,11 +1,17 @@
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Body, Depends
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Body, Depends, Request
 from fastapi.responses import JSONResponse
-from typing import Annotated, Optional, Dict, Any, List
+from typing import Annotated, Optional, Dict, Any, List, BinaryIO, Union
 from pydantic import BaseModel, Field
 from src.core.app_settings import settings
 from src.core.error_handlers import DocumentProcessingError
-from src.infrastructure.document_processing.pdf_processor import LangChainDocumentProcessor
+from src.infrastructure.document_processing.pdf_processor import LangChainDocumentProcessor, process_pdf_in_worker
 from src.infrastructure.vector_store.supabase_store import LangChainVectorStore
+from src.infrastructure.cache.response_cache import ExactResponseCache
+from src.infrastructure.cache.semantic_cache import SemanticCache
+from src.infrastructure.cache.processed_document_cache import ProcessedDocumentCache, content_digest
+from src.infrastructure.uploads.session_store import UploadSessionStore
+from src.api.dependencies import get_document_processor, get_pdf_pool, get_processed_cache, get_response_cache, get_semantic_cache, get_upload_sessions, get_vector_store
+from langchain_core.documents import Document
 import os
 import tempfile
 import logging
@@ -13,109 +19,83 @@ import traceback
 import time
 import uuid
 import shutil
-import base64
+try:
+    import pybase64 as base64  # SIMD base64 (libbase64) with the stdlib API
+except ImportError:
+    import base64
 import json
+import orjson
 from pathlib import Path
-import threading
+from concurrent.futures import ProcessPoolExecutor
 import asyncio
 
+# pybase64 can decode straight into a bytearray, avoiding an intermediate bytes copy
+b64decode_chunk = getattr(base64, "b64decode_as_bytearray", base64.b64decode)
+
 # Set up logger
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)  # Set to DEBUG for maximum verbosity
+logger.setLevel(settings.LOG_LEVEL)
 
 router = APIRouter()
 
-# Initialize components
-try:
-    logger.info("Initializing document processor with chunk_size=%d", settings.CHUNK_SIZE)
-    document_processor = LangChainDocumentProcessor(
-        chunk_size=settings.CHUNK_SIZE,
-        gemini_api_key=settings.GEMINI_API_KEY
-    )
-    logger.info("Document processor initialized successfully")
-except Exception as e:
-    logger.error("Failed to initialize document processor: %s", str(e))
-    logger.error(traceback.format_exc())
-    raise
-
-try:
-    logger.info("Initializing vector store with Supabase URL=%s, table=%s", 
-                settings.SUPABASE_URL, settings.SUPABASE_TABLE)
-    vector_store = LangChainVectorStore(
-        supabase_url=settings.SUPABASE_URL,
-        supabase_key=settings.SUPABASE_KEY,
-        gemini_api_key=settings.GEMINI_API_KEY,
-        table_name=settings.SUPABASE_TABLE
-    )
-    logger.info("Vector store initialized successfully")
-    
-    # Verify GCP credentials
-    logger.info("Verifying GCP credentials")
-    try:
-        # Test GCP connection
-        test_id = f"test_{uuid.uuid4().hex[:8]}"
-        test_content = b"Test content"
-        test_url = vector_store.upload_to_gcp(
-            buffer=test_content,
-            filename=f"{test_id}.txt",
-            destination=settings.GCP_DESTINATION_FOLDER
-        )
-        logger.info(f"GCP credentials verified. Test upload successful: {test_url}")
-    except Exception as e:
-        logger.warning(f"GCP credentials verification failed: {str(e)}")
-        logger.warning("Document uploads may fail if GCP access is not configured properly")
-except Exception as e:
-    logger.error(f"Failed to initialize vector store: {str(e)}")
-    logger.error(traceback.format_exc())
-    raise
-
 # Set max file size to 10MB
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB in bytes
 MAX_FILE_SIZE_MB = MAX_FILE_SIZE / (1024 * 1024)
 
-# Dictionary to store chunked upload sessions
-# In a production environment, this would be stored in a database
-chunked_uploads = {}
+# Successful GCP checks are reused for this many seconds so probes don't hit GCS every time
+GCP_HEALTH_TTL = 300
+_gcp_verified_at = 0.0
 
-# Helper function to clean up expired upload sessions
-def cleanup_expired_uploads():
+@router.get("/health/gcp")
+async def gcp_health(vector_store: LangChainVectorStore = Depends(get_vector_store)):
     """
-    Removes expired upload sessions and cleans up temporary files
+    Verify GCP credentials with a bucket lookup (no test object is written).
     """
-    now = time.time()
-    expired_ids = []
-    
-    for upload_id, session in chunked_uploads.items():
-        # Check if session has expired
-        if session.get("expires_at", 0) < now:
-            expired_ids.append(upload_id)
-            request_id = session.get("request_id", "unknown")
-            temp_dir = session.get("temp_dir")
-            
-            # Clean up temporary files
-            if temp_dir and os.path.exists(temp_dir):
-                try:
-                    shutil.rmtree(temp_dir)
-                    logger.info(f"[{request_id}] Cleaned up expired upload session {upload_id}, removed temp dir: {temp_dir}")
-                except Exception as e:
-                    logger.warning(f"[{request_id}] Failed to remove temp directory for expired upload {upload_id}: {str(e)}")
+    global _gcp_verified_at
+    if time.monotonic() - _gcp_verified_at < GCP_HEALTH_TTL:
+        return {"status": "ok"}
     
-    # Remove expired sessions
-    for upload_id in expired_ids:
-        chunked_uploads.pop(upload_id, None)
-    
-    if expired_ids:
-        logger.info(f"Cleaned up {len(expired_ids)} expired upload sessions")
+    request_id = uuid.uuid4().hex[:8]
+    logger.info("[%s] Verifying GCP credentials", request_id)
+    try:
+        await asyncio.to_thread(vector_store.verify_gcp_access)
+        _gcp_verified_at = time.monotonic()
+        logger.info("[%s] GCP credentials verified", request_id)
+        return {"status": "ok"}
+    except Exception as e:
+        logger.warning("[%s] GCP credentials verification failed: %s", request_id, e)
+        raise HTTPException(status_code=503, detail=f"GCP credentials verification failed: {str(e)}")
 
-# Start periodic cleanup (every 15 minutes)
-def periodic_cleanup():
-    """Run cleanup every 15 minutes"""
-    cleanup_expired_uploads()
-    # Schedule next cleanup in 15 minutes
-    threading.Timer(15 * 60, periodic_cleanup).start()
+# Helper function to clean up expired upload sessions
+async def cleanup_expired_uploads(upload_sessions: UploadSessionStore):
+    """
+    Removes expired upload sessions and cleans up temporary files
+    """
+    for session in await upload_sessions.pop_expired():
+        upload_id = session["upload_id"]
+        request_id = session.get("request_id", "unknown")
+        temp_dir = session.get("temp_dir")
+        
+        # Clean up temporary files
+        if temp_dir and os.path.exists(temp_dir):
+            try:
+                await asyncio.to_thread(shutil.rmtree, temp_dir)
+                logger.info("[%s] Cleaned up expired upload session %s, removed temp dir: %s", request_id, upload_id, temp_dir)
+            except Exception as e:
+                logger.warning("[%s] Failed to remove temp directory for expired upload %s: %s", request_id, upload_id, e)
 
-# Start cleanup thread when module is loaded
-periodic_cleanup()
+async def reap_expired_uploads(upload_sessions: UploadSessionStore, interval: float = 60):
+    """
+    Background task that removes expired upload sessions every interval seconds.
+    
+    Started and cancelled by the app lifespan (see src/main.py).
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await cleanup_expired_uploads(upload_sessions)
+        except Exception as e:
+            logger.warning("Failed to clean up expired upload sessions: %s", e)
 
 # Models for chunked upload
 class UploadInitRequest(BaseModel):
@@ -124,6 +104,7 @@ class UploadInitRequest(BaseModel):
     total_chunks: int
     total_size: int
     mime_type: str = "application/pdf"
+    chunk_size: int = 1024 * 1024  # Size of every chunk except the last, which may be shorter
 
 class UploadInitResponse(BaseModel):
     """Response model for chunked upload initialization"""
@@ -150,158 +131,284 @@ class FinalizeUploadRequest(BaseModel):
     original_name: str
 
 @router.post("/initiate_chunked_upload/", response_model=UploadInitResponse)
-async def initiate_chunked_upload(request: UploadInitRequest):
+async def initiate_chunked_upload(
+    request: UploadInitRequest,
+    upload_sessions: UploadSessionStore = Depends(get_upload_sessions)
+):
     """
     Initiate a chunked upload process for a large file.
     Returns an upload_id that must be used for subsequent chunk uploads.
     """
-    # Clean up expired sessions before creating a new one
-    cleanup_expired_uploads()
-    
     # Generate a unique upload ID
     upload_id = uuid.uuid4().hex
     request_id = uuid.uuid4().hex[:8]
-    logger.info(f"[{request_id}] Initiating chunked upload for {request.file_name}, size: {request.total_size/1024/1024:.2f}MB, chunks: {request.total_chunks}")
+    logger.info("[%s] Initiating chunked upload for %s, size: %.2fMB, chunks: %s", request_id, request.file_name, request.total_size/1024/1024, request.total_chunks)
     
     # Validate mime type
     if request.mime_type != "application/pdf":
-        logger.error(f"[{request_id}] Invalid file type: {request.mime_type}")
+        logger.error("[%s] Invalid file type: %s", request_id, request.mime_type)
         raise HTTPException(status_code=400, detail="Only PDF files are allowed")
     
-    # Create a temporary directory for this upload
+    # Chunks are written in place at chunk_index * chunk_size, so the layout must be consistent
+    if request.chunk_size <= 0 or request.total_chunks != -(-request.total_size // request.chunk_size):
+        logger.error("[%s] Inconsistent chunk layout: size=%s, chunk_size=%s, chunks=%s", request_id, request.total_size, request.chunk_size, request.total_chunks)
+        raise HTTPException(status_code=400, detail="total_chunks does not match total_size and chunk_size")
+    
+    # Create a temporary directory for this upload and preallocate the destination file
     temp_dir = tempfile.mkdtemp(prefix=f"chunked_{upload_id}_")
+    file_path = os.path.join(temp_dir, f"complete_{upload_id}.pdf")
+    await asyncio.to_thread(preallocate_file, file_path, request.total_size)
     
     # Initialize the upload session with a 1-hour expiration
     expires_at = time.time() + 3600  # 1 hour expiration
     
-    chunked_uploads[upload_id] = {
+    await upload_sessions.create(upload_id, {
         "file_name": request.file_name,
         "mime_type": request.mime_type,
         "total_chunks": request.total_chunks,
         "total_size": request.total_size,
-        "chunks_received": 0,
+        "chunk_size": request.chunk_size,
         "temp_dir": temp_dir,
-        "chunks": {},
+        "file_path": file_path,
         "expires_at": expires_at,
-        "is_complete": False,
         "created_at": time.time(),
         "request_id": request_id
-    }
+    })
     
-    logger.info(f"[{request_id}] Chunked upload initiated: {upload_id}, expires at {time.ctime(expires_at)}")
+    logger.info("[%s] Chunked upload initiated: %s, expires at %s", request_id, upload_id, time.ctime(expires_at))
     
     return UploadInitResponse(
         upload_id=upload_id,
         expires_at=time.ctime(expires_at)
     )
 
-@router.post("/upload_chunk/", response_model=ChunkUploadResponse)
-async def upload_chunk(request: ChunkUploadRequest):
+async def get_chunk_session(upload_sessions: UploadSessionStore, upload_id: str, chunk_index: int) -> Dict[str, Any]:
     """
-    Upload a chunk of a file in a chunked upload process.
+    Return the upload session for a chunk after validating the upload ID and chunk index.
     """
     # Validate upload ID exists
-    if request.upload_id not in chunked_uploads:
+    upload_session = await upload_sessions.get(upload_id)
+    if upload_session is None:
         raise HTTPException(status_code=404, detail="Upload session not found or expired")
     
-    upload_session = chunked_uploads[request.upload_id]
     request_id = upload_session["request_id"]
     
     # Validate chunk index
-    if request.chunk_index < 0 or request.chunk_index >= upload_session["total_chunks"]:
-        logger.error(f"[{request_id}] Invalid chunk index: {request.chunk_index}, total chunks: {upload_session['total_chunks']}")
+    if chunk_index < 0 or chunk_index >= upload_session["total_chunks"]:
+        logger.error("[%s] Invalid chunk index: %s, total chunks: %s", request_id, chunk_index, upload_session['total_chunks'])
         raise HTTPException(status_code=400, detail="Invalid chunk index")
     
     # Validate upload is not already complete
     if upload_session["is_complete"]:
-        logger.error(f"[{request_id}] Upload already finalized: {request.upload_id}")
+        logger.error("[%s] Upload already finalized: %s", request_id, upload_id)
         raise HTTPException(status_code=400, detail="Upload already finalized")
     
+    return upload_session
+
+def expected_chunk_size(upload_session: Dict[str, Any], chunk_index: int) -> int:
+    """
+    Return the byte size of a chunk: every chunk but the last is exactly chunk_size,
+    the last holds the remainder.
+    """
+    return min(
+        upload_session["chunk_size"],
+        upload_session["total_size"] - chunk_index * upload_session["chunk_size"]
+    )
+
+def reject_oversized_chunk(upload_session: Dict[str, Any], chunk_index: int, size: int, max_size: int) -> None:
+    """Raise 413 if a chunk payload exceeds max_size, before it is decoded or written."""
+    if size > max_size:
+        logger.error("[%s] Chunk %s payload of %s bytes exceeds the %s byte limit", upload_session["request_id"], chunk_index, size, max_size)
+        raise HTTPException(status_code=413, detail=f"Chunk {chunk_index} is larger than the declared chunk size")
+
+async def record_chunk(
+    upload_sessions: UploadSessionStore,
+    upload_id: str,
+    upload_session: Dict[str, Any],
+    chunk_index: int,
+    chunk_size: int
+) -> ChunkUploadResponse:
+    """
+    Register a written chunk with its upload session and build the chunk response.
+    """
+    expected_size = expected_chunk_size(upload_session, chunk_index)
+    if chunk_size != expected_size:
+        logger.error("[%s] Chunk %s has %s bytes, expected %s", upload_session["request_id"], chunk_index, chunk_size, expected_size)
+        raise HTTPException(status_code=400, detail=f"Chunk {chunk_index} has {chunk_size} bytes, expected {expected_size}")
+    
+    # Re-sent chunks overwrite the same range and are only counted once
+    chunks_received = await upload_sessions.record_chunk(upload_id, chunk_index)
+    
+    # Log progress
+    logger.info("[%s] Received chunk %s/%s for upload %s, size: %.2fKB",
+                upload_session["request_id"], chunk_index + 1, upload_session['total_chunks'],
+                upload_id, chunk_size/1024)
+    
+    # Check if all chunks have been received
+    is_complete = chunks_received == upload_session["total_chunks"]
+    
+    return ChunkUploadResponse(
+        upload_id=upload_id,
+        chunks_received=chunks_received,
+        total_chunks=upload_session["total_chunks"],
+        is_complete=is_complete
+    )
+
+def parse_chunk_request(body: bytes) -> ChunkUploadRequest:
+    """
+    Parse a JSON chunk upload body without running Pydantic validation over chunk_data.
+    
+    Only the small header fields are type-checked; the base64 payload is handed
+    to the decoder as-is, which rejects malformed data anyway.
+    """
+    try:
+        payload = orjson.loads(body)
+    except orjson.JSONDecodeError as e:
+        raise HTTPException(status_code=422, detail=f"Invalid JSON body: {e}")
+    
+    if not isinstance(payload, dict):
+        raise HTTPException(status_code=422, detail="Request body must be a JSON object")
+    for field, field_type in (("upload_id", str), ("chunk_index", int), ("total_chunks", int), ("chunk_data", str)):
+        value = payload.get(field)
+        if not isinstance(value, field_type) or isinstance(value, bool):
+            raise HTTPException(status_code=422, detail=f"Field '{field}' is missing or not a {field_type.__name__}")
+    
+    return ChunkUploadRequest.model_construct(**{field: payload[field] for field in ChunkUploadRequest.model_fields})
+
+@router.post(
+    "/upload_chunk/",
+    response_model=ChunkUploadResponse,
+    deprecated=True,
+    # The body is parsed by hand, so document its schema explicitly
+    openapi_extra={"requestBody": {"required": True, "content": {"application/json": {"schema": ChunkUploadRequest.model_json_schema()}}}}
+)
+async def upload_chunk(
+    request: Request,
+    upload_sessions: UploadSessionStore = Depends(get_upload_sessions)
+):
+    """
+    Upload a base64-encoded chunk of a file in a chunked upload process.
+    
+    Deprecated: use /upload_chunk_binary/, which avoids the base64 overhead.
+    """
+    chunk_request = parse_chunk_request(await request.body())
+    upload_session = await get_chunk_session(upload_sessions, chunk_request.upload_id, chunk_request.chunk_index)
+    request_id = upload_session["request_id"]
+    
+    # Bound the decode allocation by the chunk's known size (base64 is 4 chars per 3 bytes)
+    max_b64_len = 4 * -(-expected_chunk_size(upload_session, chunk_request.chunk_index) // 3) + 16
+    reject_oversized_chunk(upload_session, chunk_request.chunk_index, len(chunk_request.chunk_data), max_b64_len)
+    
     try:
         # Decode base64 data
-        chunk_data = base64.b64decode(request.chunk_data)
+        chunk_data = b64decode_chunk(chunk_request.chunk_data)
         
-        # Save chunk to temporary file
-        chunk_path = os.path.join(upload_session["temp_dir"], f"chunk_{request.chunk_index}")
-        with open(chunk_path, "wb") as f:
-            f.write(chunk_data)
+        # Write the chunk at its offset in the preallocated file, off the event loop
+        offset = chunk_request.chunk_index * upload_session["chunk_size"]
+        await asyncio.to_thread(write_at, upload_session["file_path"], chunk_data, offset)
         
-        # Update upload session
-        upload_session["chunks"][request.chunk_index] = chunk_path
-        upload_session["chunks_received"] += 1
-        
-        # Log progress
-        logger.info(f"[{request_id}] Received chunk {request.chunk_index + 1}/{upload_session['total_chunks']} "
-                   f"for upload {request.upload_id}, size: {len(chunk_data)/1024:.2f}KB")
-        
-        # Check if all chunks have been received
-        is_complete = upload_session["chunks_received"] == upload_session["total_chunks"]
+        return await record_chunk(upload_sessions, chunk_request.upload_id, upload_session, chunk_request.chunk_index, len(chunk_data))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("[%s] Error processing chunk: %s", request_id, e)
+        logger.error(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=f"Error processing chunk: {str(e)}")
+
+@router.post("/upload_chunk_binary/", response_model=ChunkUploadResponse)
+async def upload_chunk_binary(
+    request: Request,
+    upload_id: str,
+    chunk_index: int,
+    upload_sessions: UploadSessionStore = Depends(get_upload_sessions)
+):
+    """
+    Upload a chunk of a file as the raw request body (Content-Type: application/octet-stream).
+    
+    The body is streamed straight into its range of the preallocated upload file.
+    """
+    upload_session = await get_chunk_session(upload_sessions, upload_id, chunk_index)
+    request_id = upload_session["request_id"]
+    
+    try:
+        offset = chunk_index * upload_session["chunk_size"]
+        max_size = expected_chunk_size(upload_session, chunk_index)
+        chunk_size = 0
+        async for piece in request.stream():
+            if piece:
+                # Stop before writing past this chunk's range into the next one
+                reject_oversized_chunk(upload_session, chunk_index, chunk_size + len(piece), max_size)
+                await asyncio.to_thread(write_at, upload_session["file_path"], piece, offset + chunk_size)
+                chunk_size += len(piece)
         
-        return ChunkUploadResponse(
-            upload_id=request.upload_id,
-            chunks_received=upload_session["chunks_received"],
-            total_chunks=upload_session["total_chunks"],
-            is_complete=is_complete
-        )
+        return await record_chunk(upload_sessions, upload_id, upload_session, chunk_index, chunk_size)
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"[{request_id}] Error processing chunk: {str(e)}")
+        logger.error("[%s] Error processing chunk: %s", request_id, e)
         logger.error(traceback.format_exc())
         raise HTTPException(status_code=500, detail=f"Error processing chunk: {str(e)}")
 
 @router.post("/finalize_chunked_upload/")
-async def finalize_chunked_upload(request: FinalizeUploadRequest):
+async def finalize_chunked_upload(
+    request: FinalizeUploadRequest,
+    document_processor: LangChainDocumentProcessor = Depends(get_document_processor),
+    pdf_pool: ProcessPoolExecutor = Depends(get_pdf_pool),
+    vector_store: LangChainVectorStore = Depends(get_vector_store),
+    response_cache: ExactResponseCache = Depends(get_response_cache),
+    semantic_cache: SemanticCache = Depends(get_semantic_cache),
+    processed_cache: ProcessedDocumentCache = Depends(get_processed_cache),
+    upload_sessions: UploadSessionStore = Depends(get_upload_sessions)
+):
     """
-    Finalize a chunked upload, combining all chunks and processing the document.
+    Finalize a chunked upload and process the document.
     """
     # Validate upload ID exists
-    if request.upload_id not in chunked_uploads:
+    upload_session = await upload_sessions.get(request.upload_id)
+    if upload_session is None:
         raise HTTPException(status_code=404, detail="Upload session not found or expired")
     
-    upload_session = chunked_uploads[request.upload_id]
     request_id = upload_session["request_id"]
     
     # Validate all chunks have been received
     if upload_session["chunks_received"] != upload_session["total_chunks"]:
-        logger.error(f"[{request_id}] Not all chunks received: {upload_session['chunks_received']}/{upload_session['total_chunks']}")
+        logger.error("[%s] Not all chunks received: %s/%s", request_id, upload_session['chunks_received'], upload_session['total_chunks'])
         raise HTTPException(status_code=400, detail="Not all chunks have been uploaded")
     
-    # Mark as complete to prevent further uploads
-    upload_session["is_complete"] = True
+    # Mark as complete to prevent further uploads; only one finalize request may proceed
+    if not await upload_sessions.mark_complete(request.upload_id):
+        logger.error("[%s] Upload already finalized: %s", request_id, request.upload_id)
+        raise HTTPException(status_code=400, detail="Upload already finalized")
     
     temp_dir = upload_session["temp_dir"]
-    temp_file_path = os.path.join(temp_dir, f"complete_{request.upload_id}.pdf")
+    # Chunks were written in place, so the file is already complete
+    temp_file_path = upload_session["file_path"]
     
     try:
-        logger.info(f"[{request_id}] Finalizing chunked upload {request.upload_id}, combining {upload_session['total_chunks']} chunks")
-        
-        # Combine all chunks into a single file
-        with open(temp_file_path, "wb") as outfile:
-            for i in range(upload_session["total_chunks"]):
-                chunk_path = upload_session["chunks"][i]
-                with open(chunk_path, "rb") as infile:
-                    outfile.write(infile.read())
-        
-        file_size = os.path.getsize(temp_file_path)
-        logger.info(f"[{request_id}] Combined file size: {file_size/1024/1024:.2f}MB")
-        
-        # Read the file
-        with open(temp_file_path, "rb") as f:
-            file_content = f.read()
+        logger.info("[%s] Finalizing chunked upload %s (%s chunks, %.2fMB)", request_id, request.upload_id, upload_session['total_chunks'], upload_session['total_size']/1024/1024)
         
         # Process the document using the existing processing logic
         result = await process_document(
             request_id=request_id,
-            file_content=file_content,
+            file_path=temp_file_path,
             original_name=request.original_name,
-            filename=Path(request.original_name).name
+            filename=Path(request.original_name).name,
+            document_processor=document_processor,
+            pdf_pool=pdf_pool,
+            vector_store=vector_store,
+            response_cache=response_cache,
+            semantic_cache=semantic_cache,
+            processed_cache=processed_cache
         )
         
         # Clean up the session
-        del chunked_uploads[request.upload_id]
+        await upload_sessions.delete(request.upload_id)
         
         return result
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"[{request_id}] Error finalizing upload: {str(e)}")
+        logger.error("[%s] Error finalizing upload: %s", request_id, e)
         logger.error(traceback.format_exc())
         raise HTTPException(status_code=500, detail=f"Error finalizing upload: {str(e)}")
     finally:
@@ -309,128 +416,189 @@ async def finalize_chunked_upload(request: FinalizeUploadRequest):
         try:
             if os.path.exists(temp_dir):
                 shutil.rmtree(temp_dir)
-                logger.debug(f"[{request_id}] Removed temporary directory: {temp_dir}")
+                logger.debug("[%s] Removed temporary directory: %s", request_id, temp_dir)
         except Exception as e:
-            logger.warning(f"[{request_id}] Failed to clean up temporary files: {str(e)}")
+            logger.warning("[%s] Failed to clean up temporary files: %s", request_id, e)
+
+def preallocate_file(path: str, size: int) -> None:
+    """
+    Create a file of the given size for chunks to be written into.
+    
+    Uses posix_fallocate where available so the blocks are reserved up front;
+    otherwise the file is extended with truncate.
+    """
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT, 0o600)
+    try:
+        if size > 0 and hasattr(os, "posix_fallocate"):
+            os.posix_fallocate(fd, 0, size)
+        else:
+            os.ftruncate(fd, size)
+    finally:
+        os.close(fd)
+
+def write_at(path: str, data: Union[bytes, bytearray, memoryview], offset: int) -> None:
+    """
+    Write a bytes-like object into an existing file at the given offset.
+    
+    Run via asyncio.to_thread from request handlers.
+    """
+    view = memoryview(data)
+    fd = os.open(path, os.O_WRONLY)
+    try:
+        # pwrite may write less than requested
+        while view:
+            written = os.pwrite(fd, view, offset)
+            view = view[written:]
+            offset += written
+    finally:
+        os.close(fd)
+
+def save_upload_file(source: BinaryIO, destination: str) -> int:
+    """
+    Stream an uploaded file to disk in 1MB blocks and return the number of bytes written.
+    """
+    with open(destination, "wb") as f:
+        shutil.copyfileobj(source, f, length=1024 * 1024)
+    return os.path.getsize(destination)
 
 # Extract document processing into a separate function
-async def process_document(request_id: str, file_content: bytes, original_name: str, filename: str):
+async def process_document(
+    request_id: str,
+    file_path: str,
+    original_name: str,
+    filename: str,
+    document_processor: LangChainDocumentProcessor,
+    pdf_pool: ProcessPoolExecutor,
+    vector_store: LangChainVectorStore,
+    response_cache: ExactResponseCache,
+    semantic_cache: SemanticCache,
+    processed_cache: ProcessedDocumentCache
+):
     """
-    Process a document using LangChain components and store in Supabase and GCP.
+    Process a PDF already saved at file_path using LangChain components and store in Supabase and GCP.
+    
+    Re-uploads of a file whose content was processed before reuse its chunks and
+    embeddings from processed_cache and only repeat the GCP upload and inserts.
     """
     start_time = time.time()
-    temp_dir = None
-    temp_file_path = None
     
     try:
-        # Create a temporary directory
-        temp_dir = tempfile.mkdtemp(prefix=f"process_{request_id}_")
-        logger.debug(f"[{request_id}] Created temporary directory: {temp_dir}")
-        
-        # Save the file content to a temporary file
-        temp_file_path = os.path.join(temp_dir, f"{request_id}.pdf")
-        logger.debug(f"[{request_id}] Creating temporary file at {temp_file_path}")
+        # Verify the file is in place before starting the pipeline
+        if not os.path.exists(file_path):
+            raise Exception(f"Temporary file not found at {file_path}")
         
-        with open(temp_file_path, "wb") as f:
-            f.write(file_content)
-        logger.info(f"[{request_id}] File saved to temporary location: {temp_file_path}")
-        
-        # Verify file was written correctly
-        if not os.path.exists(temp_file_path):
-            raise Exception(f"Failed to write temporary file at {temp_file_path}")
-        
-        file_size = os.path.getsize(temp_file_path)
-        if file_size != len(file_content):
-            raise Exception(f"File size mismatch. Expected {len(file_content)}, got {file_size}")
-        
-        logger.debug(f"[{request_id}] File verification successful: {file_size} bytes")
+        file_size = os.path.getsize(file_path)
+        logger.debug("[%s] File verification successful: %s bytes", request_id, file_size)
+        temp_file_path = file_path
         
         # Process steps with detailed logging for each stage
         try:
+            # One read of the file yields the processed-document cache key and the blob name
+            content_hash = await asyncio.to_thread(content_digest, temp_file_path)
+            
             # Step 1: Process PDF
-            logger.info(f"[{request_id}] Processing PDF document")
-            start_process = time.time()
-            try:
-                logger.debug(f"[{request_id}] Document processor configuration: chunk_size={document_processor.chunk_size}")
-                documents = document_processor.process_pdf(pdf_path=temp_file_path)
-                logger.info(f"[{request_id}] PDF processed successfully. Extracted {len(documents)} chunks in {time.time() - start_process:.2f} seconds")
-                if documents and len(documents) > 0:
-                    logger.debug(f"[{request_id}] First document sample: {documents[0].page_content[:100]}...")
-            except Exception as e:
-                logger.error(f"[{request_id}] Failed to process PDF: {str(e)}")
-                logger.error(traceback.format_exc())
-                raise HTTPException(status_code=500, detail=f"Failed to process PDF: {str(e)}")
+            async def process_pdf_step():
+                logger.info("[%s] Processing PDF document", request_id)
+                start_process = time.time()
+                try:
+                    logger.debug("[%s] Document processor configuration: chunk_size=%s", request_id, document_processor.chunk_size)
+                    # Parse in a worker process so concurrent uploads use all cores
+                    loop = asyncio.get_running_loop()
+                    documents = await loop.run_in_executor(pdf_pool, process_pdf_in_worker, temp_file_path)
+                    logger.info("[%s] PDF processed successfully. Extracted %s chunks in %.2f seconds", request_id, len(documents), time.time() - start_process)
+                    if documents and logger.isEnabledFor(logging.DEBUG):
+                        logger.debug("[%s] First document sample: %s...", request_id, documents[0].page_content[:100])
+                    return documents
+                except Exception as e:
+                    logger.error("[%s] Failed to process PDF: %s", request_id, e)
+                    logger.error(traceback.format_exc())
+                    raise HTTPException(status_code=500, detail=f"Failed to process PDF: {str(e)}")
             
             # Step 2: Generate embeddings
-            logger.info(f"[{request_id}] Generating embeddings")
-            start_embed = time.time()
-            try:
-                embeddings = document_processor.generate_embeddings(documents)
-                logger.info(f"[{request_id}] Embeddings generated successfully in {time.time() - start_embed:.2f} seconds")
-            except Exception as e:
-                logger.error(f"[{request_id}] Failed to generate embeddings: {str(e)}")
-                logger.error(traceback.format_exc())
-                raise HTTPException(status_code=500, detail=f"Failed to generate embeddings: {str(e)}")
+            async def embed_step(documents):
+                logger.info("[%s] Generating embeddings", request_id)
+                start_embed = time.time()
+                try:
+                    embeddings = await document_processor.agenerate_embeddings(documents)
+                    logger.info("[%s] Embeddings generated successfully in %.2f seconds", request_id, time.time() - start_embed)
+                    return embeddings
+                except Exception as e:
+                    logger.error("[%s] Failed to generate embeddings: %s", request_id, e)
+                    logger.error(traceback.format_exc())
+                    raise HTTPException(status_code=500, detail=f"Failed to generate embeddings: {str(e)}")
             
             # Step 3: Upload to GCP
-            logger.info(f"[{request_id}] Uploading to Google Cloud Storage")
-            start_gcp = time.time()
-            try:
-                logger.debug(f"[{request_id}] GCP destination folder: {settings.GCP_DESTINATION_FOLDER}")
-                gcp_url = vector_store.upload_to_gcp(
-                    buffer=file_content,
-                    filename=filename,
-                    destination=settings.GCP_DESTINATION_FOLDER
-                )
-                logger.info(f"[{request_id}] File uploaded to GCP successfully in {time.time() - start_gcp:.2f} seconds")
-                logger.debug(f"[{request_id}] GCP URL: {gcp_url}")
-            except Exception as e:
-                logger.error(f"[{request_id}] Failed to upload to GCP: {str(e)}")
-                logger.error(traceback.format_exc())
-                raise HTTPException(status_code=500, detail=f"Failed to upload to GCP: {str(e)}")
+            async def upload_step():
+                logger.info("[%s] Uploading to Google Cloud Storage", request_id)
+                start_gcp = time.time()
+                try:
+                    logger.debug("[%s] GCP destination folder: %s", request_id, settings.GCP_DESTINATION_FOLDER)
+                    gcp_url = await asyncio.to_thread(
+                        vector_store.upload_file_to_gcp,
+                        file_path=temp_file_path,
+                        filename=filename,
+                        destination=settings.GCP_DESTINATION_FOLDER,
+                        content_hash=content_hash
+                    )
+                    logger.info("[%s] File uploaded to GCP successfully in %.2f seconds", request_id, time.time() - start_gcp)
+                    logger.debug("[%s] GCP URL: %s", request_id, gcp_url)
+                    return gcp_url
+                except Exception as e:
+                    logger.error("[%s] Failed to upload to GCP: %s", request_id, e)
+                    logger.error(traceback.format_exc())
+                    raise HTTPException(status_code=500, detail=f"Failed to upload to GCP: {str(e)}")
             
             # Step 4: Insert file metadata
-            logger.info(f"[{request_id}] Inserting file metadata to Supabase")
-            start_meta = time.time()
-            try:
-                logger.debug(f"[{request_id}] Supabase table: {settings.SUPABASE_TABLE}")
-                file_id = vector_store.insert_file_metadata(
-                    title=original_name,
-                    link=gcp_url
-                )
-                logger.info(f"[{request_id}] File metadata inserted successfully in {time.time() - start_meta:.2f} seconds. File ID: {file_id}")
-            except Exception as e:
-                logger.error(f"[{request_id}] Failed to insert file metadata: {str(e)}")
-                logger.error(traceback.format_exc())
-                raise HTTPException(status_code=500, detail=f"Failed to insert file metadata: {str(e)}")
+            async def metadata_step(gcp_url):
+                logger.info("[%s] Inserting file metadata to Supabase", request_id)
+                start_meta = time.time()
+                try:
+                    logger.debug("[%s] Supabase table: %s", request_id, settings.SUPABASE_TABLE)
+                    file_id = await vector_store.ainsert_file_metadata(
+                        title=original_name,
+                        link=gcp_url
+                    )
+                    logger.info("[%s] File metadata inserted successfully in %.2f seconds. File ID: %s", request_id, time.time() - start_meta, file_id)
+                    return file_id
+                except Exception as e:
+                    logger.error("[%s] Failed to insert file metadata: %s", request_id, e)
+                    logger.error(traceback.format_exc())
+                    raise HTTPException(status_code=500, detail=f"Failed to insert file metadata: {str(e)}")
+            
+            # Parsing and the GCP upload are independent; embeddings only need the parsed
+            # documents and the metadata insert only needs the GCP URL
+            cached = processed_cache.get(content_hash)
+            if cached is not None:
+                texts, embeddings = cached
+                logger.info("[%s] Identical file processed before; reusing %s chunks and their embeddings", request_id, len(texts))
+                documents = [Document(page_content=text) for text in texts]
+                gcp_url = await upload_step()
+                file_id = await metadata_step(gcp_url)
+            else:
+                documents, gcp_url = await asyncio.gather(process_pdf_step(), upload_step())
+                embeddings, file_id = await asyncio.gather(embed_step(documents), metadata_step(gcp_url))
+                processed_cache.put(content_hash, [doc.page_content for doc in documents], embeddings)
             
             # Step 5: Add documents to vector store
-            logger.info(f"[{request_id}] Adding documents to vector store")
+            logger.info("[%s] Adding documents to vector store", request_id)
             start_vector = time.time()
             try:
-                metadata_list = [
-                    {
-                        "id": f"{file_id}_chunk_{i}",
+                id_prefix = f"{file_id}_chunk_"
+                for i, doc in enumerate(documents):
+                    doc.metadata = {
+                        "id": f"{id_prefix}{i}",
                         "fileId": file_id,
                         "position": i,
                         "originalName": original_name,
                         "downloadUrl": gcp_url
                     }
-                    for i in range(len(documents))
-                ]
-            
-                if len(documents) != len(metadata_list):
-                    logger.error(f"[{request_id}] Mismatch between number of documents ({len(documents)}) and metadata entries ({len(metadata_list)})")
-                    raise ValueError("Mismatch between number of documents and metadata entries prepared.")
-
-                for doc, meta in zip(documents, metadata_list):
-                    doc.metadata = meta
                 
-                # Use batch insertion with a batch size of 50
-                vector_store.add_documents_batch(documents, embeddings_list=embeddings, batch_size=50)
-                logger.info(f"[{request_id}] Documents added to vector store successfully in {time.time() - start_vector:.2f} seconds")
+                # Insert in batches of 200 with several batches in flight
+                await vector_store.add_documents_async(documents, embeddings_list=embeddings, batch_size=200)
+                vector_store.clear_search_cache()
+                logger.info("[%s] Documents added to vector store successfully in %.2f seconds", request_id, time.time() - start_vector)
             except Exception as e:
-                logger.error(f"[{request_id}] Failed to add documents to vector store: {str(e)}")
+                logger.error("[%s] Failed to add documents to vector store: %s", request_id, e)
                 logger.error(traceback.format_exc())
                 raise HTTPException(status_code=500, detail=f"Failed to add documents to vector store: {str(e)}")
             
@@ -441,39 +609,45 @@ async def process_document(request_id: str, file_content: bytes, original_name:
             for attempt in range(max_retries):
                 # Try a simple query to verify the document is indexed
                 try:
-                    verification_results = vector_store.hybrid_search(
+                    verification_results = await vector_store.ahybrid_search(
                         query="",  # Empty query to just check existence
                         query_embedding=[0] * 768,  # Zero embedding
                         match_count=1,
-                        file_title=original_name
+                        file_id=file_id
                     )
                     
                     if verification_results:
-                        logger.info(f"[{request_id}] Document verified in Supabase after {attempt + 1} attempts")
+                        logger.info("[%s] Document verified in Supabase after %s attempts", request_id, attempt + 1)
                         break
                     else:
                         if attempt < max_retries - 1:
-                            logger.warning(f"[{request_id}] Document not yet indexed, waiting {retry_delay} seconds...")
+                            logger.warning("[%s] Document not yet indexed, waiting %s seconds...", request_id, retry_delay)
                             await asyncio.sleep(retry_delay)
                         else:
-                            logger.error(f"[{request_id}] Document failed to index after {max_retries} attempts")
+                            logger.error("[%s] Document failed to index after %s attempts", request_id, max_retries)
                             raise HTTPException(
                                 status_code=500,
                                 detail="Document was processed but failed to index. Please try querying again in a few moments."
                             )
                 except Exception as e:
-                    logger.error(f"[{request_id}] Error verifying document indexing: {str(e)}")
+                    logger.error("[%s] Error verifying document indexing: %s", request_id, e)
                     if attempt == max_retries - 1:
                         raise
                     await asyncio.sleep(retry_delay)
             
+            # Cached answers scoped to this title (or to all documents) may now be stale
+            await response_cache.invalidate(original_name)
+            await response_cache.invalidate(None)
+            semantic_cache.invalidate(original_name)
+            semantic_cache.invalidate(None)
+            
             total_time = time.time() - start_time
-            logger.info(f"[{request_id}] Document upload and processing completed successfully in {total_time:.2f} seconds")
+            logger.info("[%s] Document upload and processing completed successfully in %.2f seconds", request_id, total_time)
             
             return JSONResponse(content={
                 "message": "Document processed successfully",
                 "details": {
-                    "file_url": gcp_url,
+                    "file_url": vector_store.signed_url_for(gcp_url),
                     "file_id": file_id,
                     "total_chunks": len(documents),
                     "processing_time_seconds": total_time
@@ -483,20 +657,38 @@ async def process_document(request_id: str, file_content: bytes, original_name:
         except HTTPException:
             raise
         except Exception as e:
-            logger.error(f"[{request_id}] Unexpected error in document processing: {str(e)}")
+            logger.error("[%s] Unexpected error in document processing: %s", request_id, e)
             logger.error(traceback.format_exc())
             raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"[{request_id}] Unhandled exception: {str(e)}")
+        logger.error("[%s] Unhandled exception: %s", request_id, e)
         logger.error(traceback.format_exc())
         raise HTTPException(status_code=500, detail=f"Server error: {str(e)}")
 
+def file_too_large_response(request_id: str, total_size: int) -> JSONResponse:
+    """Build the 413 response that points clients at the chunked upload API."""
+    logger.error("[%s] File too large: %.2fMB exceeds limit of %sMB", request_id, total_size/(1024*1024), MAX_FILE_SIZE_MB)
+    # Instead of error, suggest chunked upload
+    return JSONResponse(
+        status_code=413,
+        content={
+            "detail": f"File too large for direct upload. Maximum size is {MAX_FILE_SIZE_MB}MB. Your file is {total_size/(1024*1024):.2f}MB.",
+            "suggestion": "Use chunked upload API for files larger than 10MB."
+        }
+    )
+
 @router.post("/upload_document/")
 async def upload_document(
     file: Annotated[UploadFile, File(description="PDF file to process")],
-    original_name: Annotated[str, Form(description="Name to save the document as")]
+    original_name: Annotated[str, Form(description="Name to save the document as")],
+    document_processor: LangChainDocumentProcessor = Depends(get_document_processor),
+    pdf_pool: ProcessPoolExecutor = Depends(get_pdf_pool),
+    vector_store: LangChainVectorStore = Depends(get_vector_store),
+    response_cache: ExactResponseCache = Depends(get_response_cache),
+    semantic_cache: SemanticCache = Depends(get_semantic_cache),
+    processed_cache: ProcessedDocumentCache = Depends(get_processed_cache)
 ):
     """
     Uploads a PDF document, processes it using LangChain components,
@@ -504,54 +696,49 @@ async def upload_document(
     """
     start_time = time.time()
     request_id = uuid.uuid4().hex[:8]  # Generate a unique ID for this request
-    logger.info(f"[{request_id}] Starting document upload process for file: {original_name}")
+    logger.info("[%s] Starting document upload process for file: %s", request_id, original_name)
     
     # Validate file exists
     if not file:
-        logger.error(f"[{request_id}] No file provided in the request")
+        logger.error("[%s] No file provided in the request", request_id)
         raise HTTPException(status_code=400, detail="No file provided")
     
     # Validate file type
     if not file.filename or not file.filename.lower().endswith('.pdf'):
-        logger.error(f"[{request_id}] Invalid file type: {file.filename}")
+        logger.error("[%s] Invalid file type: %s", request_id, file.filename)
         raise HTTPException(status_code=400, detail="Only PDF files are allowed")
     
-    # Read file content (in chunks to avoid memory issues with large files)
-    logger.info(f"[{request_id}] Reading file content for {file.filename}")
-    file_content = bytearray()
-    chunk_size = 1024 * 1024  # Read 1MB at a time
-    total_size = 0
+    # Check the size Starlette recorded while spooling the upload, before copying anything
+    if file.size is not None and file.size > MAX_FILE_SIZE:
+        return file_too_large_response(request_id, file.size)
     
-    while True:
-        chunk = await file.read(chunk_size)
-        if not chunk:
-            break
-        file_content.extend(chunk)
-        total_size += len(chunk)
-        
-        # Check file size limit during reading to avoid loading entire file into memory
+    # Stream the upload straight to a temporary file instead of buffering it in memory
+    logger.info("[%s] Saving file content for %s", request_id, file.filename)
+    temp_dir = tempfile.mkdtemp(prefix=f"process_{request_id}_")
+    temp_file_path = os.path.join(temp_dir, f"{request_id}.pdf")
+    
+    try:
+        total_size = await asyncio.to_thread(save_upload_file, file.file, temp_file_path)
         if total_size > MAX_FILE_SIZE:
-            logger.error(f"[{request_id}] File too large: {total_size/(1024*1024):.2f}MB exceeds limit of {MAX_FILE_SIZE_MB}MB")
-            # Instead of error, suggest chunked upload
-            return JSONResponse(
-                status_code=413,
-                content={
-                    "detail": f"File too large for direct upload. Maximum size is {MAX_FILE_SIZE_MB}MB. Your file is {total_size/(1024*1024):.2f}MB.",
-                    "suggestion": "Use chunked upload API for files larger than 10MB."
-                }
-            )
-    
-    # Log final file size
-    file_size_mb = total_size / (1024 * 1024)
-    logger.info(f"[{request_id}] File size: {file_size_mb:.2f}MB")
-    
-    # Convert bytearray to bytes before passing
-    file_content_as_bytes = bytes(file_content)
-    
-    # Process the document using shared processing logic
-    return await process_document(
-        request_id=request_id,
-        file_content=file_content_as_bytes, # Pass the bytes object
-        original_name=original_name,
-        filename=file.filename
-    ) 
\ No newline at end of file
+            return file_too_large_response(request_id, total_size)
+        
+        # Log final file size
+        file_size_mb = total_size / (1024 * 1024)
+        logger.info("[%s] File size: %.2fMB", request_id, file_size_mb)
+        
+        # Process the document using shared processing logic
+        return await process_document(
+            request_id=request_id,
+            file_path=temp_file_path,
+            original_name=original_name,
+            filename=file.filename,
+            document_processor=document_processor,
+            pdf_pool=pdf_pool,
+            vector_store=vector_store,
+            response_cache=response_cache,
+            semantic_cache=semantic_cache,
+            processed_cache=processed_cache
+        )
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        logger.debug("[%s] Removed temporary directory: %s", request_id, temp_dir)
@@ -13,6 +13,9 @@ class Settings:
     API_VERSION = "1.0.0"
     API_DESCRIPTION = "RAG pipeline for educational content using LangChain and Gemini"
     
+    # Logging Settings
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO").upper()
+    
     # CORS Settings
     CORS_ORIGINS = [
         "https://uncoverlearning-deploy.vercel.app",
@@ -28,10 +31,14 @@ class Settings:
     SUPABASE_URL: Optional[str] = os.getenv("SUPABASE_URL")
     SUPABASE_KEY: Optional[str] = os.getenv("SUPABASE_KEY")
     SUPABASE_TABLE: str = os.getenv("SUPABASE_TABLE", "chunks")
+    SUPABASE_DB_URL: Optional[str] = os.getenv("SUPABASE_DB_URL")  # Direct Postgres DSN for the asyncpg pool
+    DB_POOL_MIN_SIZE: int = int(os.getenv("DB_POOL_MIN_SIZE", "5"))
+    DB_POOL_MAX_SIZE: int = int(os.getenv("DB_POOL_MAX_SIZE", "15"))
     
     # GCP Settings
     GCP_BUCKET: Optional[str] = os.getenv("BUCKET")
     GCP_DESTINATION_FOLDER: str = os.getenv("GCP_DESTINATION_FOLDER", "uploaded_docs")
+    VERIFY_GCP_ON_STARTUP: bool = os.getenv("VERIFY_GCP_ON_STARTUP", "false").lower() == "true"
     
     # Model Settings
     GEMINI_API_KEY: Optional[str] = os.getenv("GEMINI_API_KEY")
@@ -41,12 +48,27 @@ class Settings:
     # Document Processing Settings
     CHUNK_SIZE: int = int(os.getenv("CHUNK_SIZE", "1000"))
     CHUNK_OVERLAP: int = int(os.getenv("CHUNK_OVERLAP", "200"))
+    CHUNKING_STRATEGY: str = os.getenv("CHUNKING_STRATEGY", "tokens")  # "tokens" or "blocks" (paragraph-aligned)
+    PDF_WORKERS: int = int(os.getenv("PDF_WORKERS", str(os.cpu_count() or 1)))  # Processes used for PDF parsing
+    OCR_WORKERS: int = int(os.getenv("OCR_WORKERS", str(min(8, os.cpu_count() or 1))))  # OCR threads per PDF worker process
     
     # Search Settings
     MATCH_COUNT: int = int(os.getenv("MATCH_COUNT", "10"))
     FULL_TEXT_WEIGHT: float = float(os.getenv("FULL_TEXT_WEIGHT", "1.0"))
     SEMANTIC_WEIGHT: float = float(os.getenv("SEMANTIC_WEIGHT", "1.0"))
-    RRF_K: int = int(os.getenv("RRF_K", "50"))
+    RRF_K: int = int(os.getenv("RRF_K", "60"))
+    
+    # Query Cache Settings
+    CACHE_ENABLED: bool = os.getenv("CACHE_ENABLED", "true").lower() == "true"
+    SEMANTIC_CACHE_THRESHOLD: float = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.97"))
+    SEMANTIC_CACHE_MAX_SIZE: int = int(os.getenv("SEMANTIC_CACHE_MAX_SIZE", "1000"))
+    SEMANTIC_CACHE_ANN_THRESHOLD: int = int(os.getenv("SEMANTIC_CACHE_ANN_THRESHOLD", "1000"))
+    EXACT_CACHE_MAX_SIZE: int = int(os.getenv("EXACT_CACHE_MAX_SIZE", "2048"))
+    EXACT_CACHE_TTL: int = int(os.getenv("EXACT_CACHE_TTL", "3600"))
+    PROCESSED_DOC_CACHE_SIZE: int = int(os.getenv("PROCESSED_DOC_CACHE_SIZE", "32"))  # Files whose chunks/embeddings are kept
+    
+    # Upload Settings
+    REDIS_URL: Optional[str] = os.getenv("REDIS_URL")  # Shares chunked upload sessions across workers
     
     @classmethod
     def validate(cls) -> None:
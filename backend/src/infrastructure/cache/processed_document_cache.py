@@ -0,0 +1,89 @@
+from collections import OrderedDict
+from typing import List, Optional, Tuple, Union
+import hashlib
+import threading
+import numpy as np
+
+
+def content_digest(source: Union[bytes, str], block_size: int = 1024 * 1024) -> str:
+    """
+    Return the BLAKE2b digest identifying a file's content.
+
+    Used both as the processed-document cache key and in content-addressed
+    blob names, so an upload is hashed once and the digest passed along.
+
+    Args:
+        source: File content, or the path of a file to read in blocks
+        block_size: Number of bytes read per block when hashing a path
+
+    Returns:
+        Hex digest of the content
+    """
+    digest = hashlib.blake2b(digest_size=32)
+    if isinstance(source, bytes):
+        digest.update(source)
+    else:
+        with open(source, "rb") as f:
+            for block in iter(lambda: f.read(block_size), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+class ProcessedDocumentCache:
+    """In-memory LRU of chunk texts and embeddings, keyed by the uploaded file's content hash."""
+
+    def __init__(self, max_size: int = 32):
+        """
+        Initialize the processed document cache.
+
+        Args:
+            max_size: Maximum number of documents kept before LRU eviction
+        """
+        self.max_size = max_size
+        # content hash -> (chunk texts, float16 embedding matrix); float16 halves the footprint
+        self._entries: "OrderedDict[str, Tuple[List[str], np.ndarray]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, content_hash: str) -> Optional[Tuple[List[str], List[List[float]]]]:
+        """
+        Return the chunk texts and embeddings cached for a file, if any.
+
+        Args:
+            content_hash: Digest from content_digest
+
+        Returns:
+            (chunk texts, embeddings), or None on a miss
+        """
+        with self._lock:
+            entry = self._entries.get(content_hash)
+            if entry is None:
+                return None
+            self._entries.move_to_end(content_hash)
+        texts, embeddings = entry
+        return list(texts), embeddings.astype(np.float32).tolist()
+
+    def put(self, content_hash: str, texts: List[str], embeddings: List[List[float]]) -> None:
+        """
+        Cache the chunk texts and embeddings produced for a file.
+
+        Args:
+            content_hash: Digest from content_digest
+            texts: Chunk texts in document order
+            embeddings: Embedding of each chunk, parallel to texts
+        """
+        if not texts or len(texts) != len(embeddings):
+            return
+        matrix = np.asarray(embeddings, dtype=np.float16)
+        with self._lock:
+            self._entries[content_hash] = (list(texts), matrix)
+            self._entries.move_to_end(content_hash)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drop all cached documents."""
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,52 @@
+from typing import Any, Dict, Optional
+from cachetools import TTLCache
+import asyncio
+import hashlib
+
+
+class ExactResponseCache:
+    """TTL-bounded cache of RAG responses keyed by the exact (normalized) query text."""
+
+    def __init__(self, max_size: int = 2048, ttl: int = 3600):
+        """
+        Initialize the exact-match cache.
+
+        Args:
+            max_size: Maximum number of cached responses
+            ttl: Time to live of each entry in seconds
+        """
+        # key -> (file title, response); the title lets uploads invalidate by title, and
+        # dies with its entry when the TTL expires or the entry is evicted
+        self._cache: TTLCache = TTLCache(maxsize=max_size, ttl=ttl)
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    def make_key(query: str, file_title: Optional[str] = None) -> str:
+        """Build the cache key for a query and its file scope."""
+        normalized = query.strip().lower()
+        return hashlib.sha256(f"{file_title or ''}|{normalized}".encode()).hexdigest()
+
+    async def get(self, query: str, file_title: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Return the cached response for a query, or None on a miss."""
+        key = self.make_key(query, file_title)
+        async with self._lock:
+            entry = self._cache.get(key)
+        return entry[1] if entry is not None else None
+
+    async def set(self, query: str, response: Dict[str, Any], file_title: Optional[str] = None) -> None:
+        """Cache the response for a query."""
+        key = self.make_key(query, file_title)
+        async with self._lock:
+            self._cache[key] = (file_title, response)
+
+    async def invalidate(self, file_title: Optional[str] = None) -> None:
+        """Drop all responses cached for a file title."""
+        async with self._lock:
+            stale = [key for key, (title, _) in self._cache.items() if title == file_title]
+            for key in stale:
+                self._cache.pop(key, None)
+
+    async def clear(self) -> None:
+        """Drop all cached responses."""
+        async with self._lock:
+            self._cache.clear()
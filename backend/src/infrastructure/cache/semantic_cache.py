@@ -0,0 +1,216 @@
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence
+import itertools
+import threading
+import numpy as np
+
+try:
+    import hnswlib
+except ImportError:  # Optional: without it the cache always scans linearly
+    hnswlib = None
+
+
+def quantize_int8(vectors: np.ndarray) -> np.ndarray:
+    """
+    Symmetrically quantize each row of a float matrix to int8 with a per-row scale.
+    
+    The scale itself is not returned: cosine similarity is scale-invariant, so
+    scores computed on the int8 rows match the float ones up to rounding error.
+    """
+    scale = np.abs(vectors).max(axis=1, keepdims=True) / 127.0
+    scale[scale == 0] = 1.0
+    return np.round(vectors / scale).astype(np.int8)
+
+
+class SemanticCache:
+    """In-memory cache of RAG responses keyed by query embedding similarity."""
+
+    def __init__(self, threshold: float = 0.97, max_size: int = 1000, ann_threshold: int = 1000):
+        """
+        Initialize the semantic cache.
+
+        Args:
+            threshold: Minimum cosine similarity for a cached entry to count as a hit
+            max_size: Maximum number of cached entries before LRU eviction
+            ann_threshold: Number of entries at which lookups switch from a linear
+                scan to an HNSW index (requires hnswlib)
+        """
+        self.threshold = threshold
+        self.max_size = max_size
+        self.ann_threshold = ann_threshold
+
+        # One int8-quantized row per cached entry; row i belongs to self._keys[i].
+        # Row norms (of the quantized rows) are kept alongside so lookups don't recompute them.
+        self._embeddings: Optional[np.ndarray] = None
+        self._norms: Optional[np.ndarray] = None
+        self._keys: List[int] = []
+        self._file_titles: List[Optional[str]] = []
+        self._title_by_key: Dict[int, Optional[str]] = {}
+
+        # Approximate nearest-neighbour index labelled by entry key, built once the
+        # cache reaches ann_threshold entries; evicted keys are marked deleted
+        self._index = None
+
+        # entry key -> cached response, ordered from least to most recently used
+        self._entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._next_key = itertools.count()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def lookup(self, query_embedding: Sequence[float], file_title: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Return the cached response for the most similar query, if similar enough.
+
+        Args:
+            query_embedding: Embedding of the incoming query
+            file_title: File title the query is scoped to; only entries with the
+                same scope are considered
+
+        Returns:
+            The cached response, or None on a miss
+        """
+        q = quantize_int8(np.asarray(query_embedding, dtype=np.float32).reshape(1, -1))[0]
+        with self._lock:
+            if self._embeddings is None or not self._keys:
+                return None
+
+            if self._index is not None:
+                return self._lookup_index_locked(q, file_title)
+
+            # Accumulate the int8 dot products in int32 to avoid overflow
+            dots = np.einsum("ij,j->i", self._embeddings, q, dtype=np.int32)
+            scores = dots / (self._norms * np.linalg.norm(q.astype(np.float32)) + 1e-9)
+
+            # Only compare against entries cached for the same file scope
+            scope_mask = np.fromiter(
+                (title == file_title for title in self._file_titles),
+                dtype=bool,
+                count=len(self._file_titles)
+            )
+            if not scope_mask.any():
+                return None
+            scores = np.where(scope_mask, scores, -np.inf)
+
+            best = int(scores.argmax())
+            if scores[best] < self.threshold:
+                return None
+
+            key = self._keys[best]
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def add(self, query_embedding: Sequence[float], response: Dict[str, Any], file_title: Optional[str] = None) -> None:
+        """
+        Cache a response for a query embedding, evicting the least recently used entry if full.
+
+        Args:
+            query_embedding: Embedding of the query that produced the response
+            response: Response payload to cache
+            file_title: File title the query was scoped to
+        """
+        row = quantize_int8(np.asarray(query_embedding, dtype=np.float32).reshape(1, -1))
+        with self._lock:
+            if self._embeddings is not None and self._embeddings.shape[1] != row.shape[1]:
+                # Embedding model changed; previous entries are not comparable
+                self._clear_locked()
+
+            while self._keys and len(self._keys) >= self.max_size:
+                lru_key = next(iter(self._entries))
+                self._remove_rows_locked([self._keys.index(lru_key)])
+
+            key = next(self._next_key)
+            norm = np.linalg.norm(row.astype(np.float32), axis=1)
+            if self._embeddings is None:
+                self._embeddings, self._norms = row, norm
+            else:
+                self._embeddings = np.concatenate([self._embeddings, row])
+                self._norms = np.concatenate([self._norms, norm])
+            self._keys.append(key)
+            self._file_titles.append(file_title)
+            self._title_by_key[key] = file_title
+            self._entries[key] = response
+
+            if self._index is not None:
+                if self._index.get_current_count() >= self._index.get_max_elements():
+                    # Deleted labels still take up capacity; rebuild from the live rows
+                    self._build_index_locked()
+                else:
+                    self._index.add_items(row.astype(np.float32), np.array([key]))
+            elif hnswlib is not None and len(self._keys) >= self.ann_threshold:
+                self._build_index_locked()
+
+    def invalidate(self, file_title: Optional[str] = None) -> int:
+        """
+        Drop all entries scoped to a file title.
+
+        Args:
+            file_title: File title whose entries should be removed
+
+        Returns:
+            Number of removed entries
+        """
+        with self._lock:
+            rows = [i for i, title in enumerate(self._file_titles) if title == file_title]
+            self._remove_rows_locked(rows)
+            return len(rows)
+
+    def clear(self) -> None:
+        """Drop all cached entries."""
+        with self._lock:
+            self._clear_locked()
+
+    def _clear_locked(self) -> None:
+        self._embeddings = None
+        self._norms = None
+        self._keys = []
+        self._file_titles = []
+        self._title_by_key.clear()
+        self._entries.clear()
+        self._index = None
+
+    def _remove_rows_locked(self, rows: List[int]) -> None:
+        if not rows:
+            return
+        drop = set(rows)
+        for i in rows:
+            key = self._keys[i]
+            self._entries.pop(key, None)
+            self._title_by_key.pop(key, None)
+            if self._index is not None:
+                self._index.mark_deleted(key)
+        self._keys = [k for i, k in enumerate(self._keys) if i not in drop]
+        self._file_titles = [t for i, t in enumerate(self._file_titles) if i not in drop]
+        if self._keys:
+            self._embeddings = np.delete(self._embeddings, rows, axis=0)
+            self._norms = np.delete(self._norms, rows)
+        else:
+            self._embeddings = None
+            self._norms = None
+            self._index = None
+
+    def _build_index_locked(self) -> None:
+        # Cosine similarity is scale-invariant, so the int8 rows can be indexed as-is
+        index = hnswlib.Index(space="cosine", dim=self._embeddings.shape[1])
+        index.init_index(max_elements=max(2 * self.max_size, len(self._keys) + 1), ef_construction=200, M=16)
+        index.add_items(self._embeddings.astype(np.float32), np.asarray(self._keys))
+        index.set_ef(50)
+        self._index = index
+
+    def _lookup_index_locked(self, q: np.ndarray, file_title: Optional[str]) -> Optional[Dict[str, Any]]:
+        try:
+            labels, distances = self._index.knn_query(
+                q.astype(np.float32),
+                k=1,
+                filter=lambda label: label in self._title_by_key and self._title_by_key[label] == file_title
+            )
+        except RuntimeError:
+            # No live entry in this file scope
+            return None
+
+        key = int(labels[0][0])
+        if key not in self._entries or 1.0 - float(distances[0][0]) < self.threshold:
+            return None
+        self._entries.move_to_end(key)
+        return self._entries[key]
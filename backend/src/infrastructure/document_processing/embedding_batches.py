@@ -0,0 +1,38 @@
+from typing import Iterator, List
+
+# Gemini rejects embedding requests over 4MiB; leave headroom for the JSON envelope
+MAX_BATCH_BYTES = 3_500_000
+# Gemini accepts at most 100 texts per batch embedding request
+MAX_BATCH_ITEMS = 100
+
+
+def pack_batches(
+    texts: List[str],
+    max_bytes: int = MAX_BATCH_BYTES,
+    max_items: int = MAX_BATCH_ITEMS
+) -> Iterator[List[str]]:
+    """
+    Greedily pack texts, in order, into the fewest embedding requests within the API limits.
+
+    A batch is flushed when adding the next text would exceed either limit. A
+    single text larger than max_bytes is sent in a batch of its own.
+
+    Args:
+        texts: Texts to embed
+        max_bytes: Maximum total UTF-8 size of the texts in one batch
+        max_items: Maximum number of texts in one batch
+
+    Yields:
+        Consecutive batches of texts; concatenated they equal texts
+    """
+    batch: List[str] = []
+    batch_bytes = 0
+    for text in texts:
+        size = len(text.encode("utf-8"))
+        if batch and (len(batch) >= max_items or batch_bytes + size > max_bytes):
+            yield batch
+            batch, batch_bytes = [], 0
+        batch.append(text)
+        batch_bytes += size
+    if batch:
+        yield batch
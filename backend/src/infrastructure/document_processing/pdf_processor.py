@@ -1,11 +1,9 @@
-from typing import List, Optional, Union
+from typing import Deque, Dict, List, Optional, Tuple, Union
 from pathlib import Path
-import io
 import fitz  # PyMuPDF
 import pytesseract
 from PIL import Image
-from langchain_community.document_loaders import PyMuPDFLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter, TokenTextSplitter
+from langchain_text_splitters import TokenTextSplitter
 from langchain_core.documents import Document
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
 import os
@@ -13,10 +11,103 @@ from dotenv import load_dotenv
 import requests
 import tiktoken
 from tqdm import tqdm
+import asyncio
+import logging
+import random
+import threading
+import time
+from functools import lru_cache
+from google.api_core.exceptions import ResourceExhausted
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from .embedding_batches import MAX_BATCH_ITEMS, pack_batches
+from ...core.app_settings import settings
+
+try:
+    import tesserocr  # Optional: links libtesseract in-process instead of spawning tesseract per page
+except ImportError:
+    tesserocr = None
 
 # Load environment variables
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+EMBEDDING_BATCH_SIZE = MAX_BATCH_ITEMS
+EMBEDDING_MAX_CONCURRENCY = 8
+# Rate-limited (429) batches are retried with full-jitter exponential backoff
+EMBEDDING_MAX_RETRIES = 5
+EMBEDDING_BACKOFF_BASE = 1.0  # seconds
+
+# Chunks shorter than this (page tails) are merged into the previous chunk of the same page
+MIN_CHUNK_TOKENS = 100
+
+# 200 DPI gives tesseract the same accuracy as 300 DPI with ~44% of the pixels
+OCR_DPI = 200
+
+# OCR threads live for the whole process so each keeps its loaded tesseract model
+_ocr_pool: Optional[ThreadPoolExecutor] = None
+_ocr_pool_lock = threading.Lock()
+_tess_local = threading.local()
+
+def _get_ocr_pool() -> ThreadPoolExecutor:
+    """Return the process-wide OCR thread pool, creating it on first use."""
+    global _ocr_pool
+    with _ocr_pool_lock:
+        if _ocr_pool is None:
+            # Tesseract runs as a subprocess (or releases the GIL under tesserocr), so
+            # OCR threads don't contend on the GIL
+            _ocr_pool = ThreadPoolExecutor(max_workers=settings.OCR_WORKERS, thread_name_prefix="ocr")
+        return _ocr_pool
+
+def _is_rate_limited(error: BaseException) -> bool:
+    """Return True if an error, or one it was raised from, is a 429 from the Gemini API."""
+    while error is not None:
+        if isinstance(error, ResourceExhausted):
+            return True
+        error = error.__cause__
+    return False
+
+def _backoff_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff delay for a retry attempt (0-based)."""
+    return random.uniform(0, EMBEDDING_BACKOFF_BASE * 2 ** attempt)
+
+@lru_cache(maxsize=None)
+def _get_splitter(chunk_size: int, chunk_overlap: int) -> TokenTextSplitter:
+    """Return a shared token splitter for the given sizes; splitters hold no per-call state."""
+    return TokenTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        encoding_name="cl100k_base",  # Using OpenAI's tokenizer as approximation
+    )
+
+def _dedupe_texts(texts: List[str]) -> Tuple[List[str], List[int]]:
+    """
+    Collapse repeated texts (page headers, footers, boilerplate) before embedding.
+    
+    Returns:
+        The unique texts in first-seen order, and for each input text the
+        index of its unique text
+    """
+    positions: Dict[str, int] = {}
+    unique_texts: List[str] = []
+    index_map: List[int] = []
+    for text in texts:
+        position = positions.get(text)
+        if position is None:
+            position = positions[text] = len(unique_texts)
+            unique_texts.append(text)
+        index_map.append(position)
+    return unique_texts, index_map
+
+def _get_tess_api() -> "tesserocr.PyTessBaseAPI":
+    """Return this thread's tesserocr API, loading the English model on first use."""
+    api = getattr(_tess_local, "api", None)
+    if api is None:
+        api = tesserocr.PyTessBaseAPI(lang="eng")
+        _tess_local.api = api
+    return api
+
 class LangChainDocumentProcessor:
     """Document processor using LangChain components."""
     
@@ -25,7 +116,8 @@ class LangChainDocumentProcessor:
         chunk_size: int = 2000,  # Default to 2000 tokens (~1200 words)
         chunk_overlap: int = 200,  # Default to 200 tokens overlap
         text_threshold: int = 20,
-        gemini_api_key: Optional[str] = None
+        gemini_api_key: Optional[str] = None,
+        chunking: str = "tokens"
     ):
         """
         Initialize the document processor.
@@ -35,8 +127,14 @@ class LangChainDocumentProcessor:
             chunk_overlap: Overlap between chunks in tokens
             text_threshold: Minimum text density for OCR fallback
             gemini_api_key: Google Gemini API key
+            chunking: "tokens" splits each page with TokenTextSplitter; "blocks"
+                packs PyMuPDF text blocks greedily so chunks follow paragraph boundaries
         """
+        if chunking not in ("tokens", "blocks"):
+            raise ValueError(f"Unknown chunking strategy: {chunking}")
+        
         self.chunk_size = chunk_size
+        self.chunking = chunking
         self.chunk_overlap = chunk_overlap
         self.text_threshold = text_threshold
         self.gemini_api_key = gemini_api_key or os.getenv("GEMINI_API_KEY")
@@ -47,155 +145,366 @@ class LangChainDocumentProcessor:
         # Initialize token counter
         self.tokenizer = tiktoken.get_encoding("cl100k_base")  # Using OpenAI's tokenizer as approximation
         
-        # Initialize text splitter with token-based approach
-        self.text_splitter = TokenTextSplitter(
-            chunk_size=self.chunk_size,
-            chunk_overlap=self.chunk_overlap,
-            encoding_name="cl100k_base",  # Using OpenAI's tokenizer as approximation
-        )
+        # Initialize text splitter with token-based approach, shared across processors
+        self.text_splitter = _get_splitter(self.chunk_size, self.chunk_overlap)
         
         self.embeddings = GoogleGenerativeAIEmbeddings(
             model="models/embedding-001",
             google_api_key=self.gemini_api_key
         )
     
-    def _extract_text_with_ocr(self, page: fitz.Page) -> str:
-        """Extract text from a page using OCR if needed."""
-        text = page.get_text()
+    def _render_page_for_ocr(self, page: fitz.Page) -> Optional[Image.Image]:
+        """Render a page to a PIL image for OCR; must run on the thread that owns the document."""
+        try:
+            # Tesseract binarizes internally, so colour only costs memory bandwidth
+            pix = page.get_pixmap(dpi=OCR_DPI, colorspace=fitz.csGRAY, alpha=False)
+            # Wrap the raw samples directly instead of a PNG encode/decode round-trip
+            return Image.frombytes("L", (pix.width, pix.height), pix.samples)
+        except Exception as e:
+            logger.warning("Rendering page for OCR failed: %s", e)
+            return None
+    
+    def _ocr_image(self, image: Optional[Image.Image]) -> str:
+        """Run OCR on a rendered page image. Safe to call from worker threads."""
+        if image is None:
+            return ""
+        try:
+            if tesserocr is not None:
+                api = _get_tess_api()
+                api.SetImage(image)
+                return api.GetUTF8Text()
+            return pytesseract.image_to_string(image)
+        except Exception as e:
+            logger.warning("OCR failed: %s", e)
+            return ""
+    
+    def _extract_text_with_ocr(self, page: fitz.Page, existing_text: Optional[str] = None) -> str:
+        """Extract text from a page using OCR if needed, reusing already extracted text if given."""
+        text = existing_text if existing_text is not None else page.get_text()
         
         # If text density is low, use OCR
         if len(text.strip()) < self.text_threshold:
-            try:
-                pix = page.get_pixmap(dpi=300)
-                img_buffer = io.BytesIO(pix.tobytes("png"))
-                image = Image.open(img_buffer)
-                text = pytesseract.image_to_string(image)
-            except Exception as e:
-                print(f"OCR failed: {e}")
-                text = ""
+            text = self._ocr_image(self._render_page_for_ocr(page))
         
         return text
     
+    def _pack_blocks(self, page_doc: Document, blocks: List[str]) -> List[Document]:
+        """
+        Pack a page's text blocks into chunks of at most chunk_size tokens in one pass.
+        
+        Consecutive chunks share trailing blocks worth up to chunk_overlap tokens.
+        Blocks that alone exceed chunk_size are split with the token splitter.
+        """
+        chunks: List[Document] = []
+        current: List[Tuple[str, int]] = []  # (block text, token count)
+        current_tokens = 0
+        
+        def emit() -> None:
+            chunks.append(Document(
+                page_content="".join(text for text, _ in current),
+                metadata=dict(page_doc.metadata)
+            ))
+        
+        for block in blocks:
+            if not block.strip():
+                continue
+            tokens = len(self.tokenizer.encode(block))
+            if tokens > self.chunk_size:
+                if current:
+                    emit()
+                    current, current_tokens = [], 0
+                chunks.extend(
+                    Document(page_content=piece, metadata=dict(page_doc.metadata))
+                    for piece in self.text_splitter.split_text(block)
+                )
+                continue
+            
+            if current and current_tokens + tokens > self.chunk_size:
+                emit()
+                # Carry the trailing blocks that fit in the overlap into the next chunk
+                overlap: List[Tuple[str, int]] = []
+                overlap_tokens = 0
+                for text, count in reversed(current):
+                    if overlap_tokens + count > self.chunk_overlap or overlap_tokens + count + tokens > self.chunk_size:
+                        break
+                    overlap.insert(0, (text, count))
+                    overlap_tokens += count
+                current, current_tokens = overlap, overlap_tokens
+            
+            current.append((block, tokens))
+            current_tokens += tokens
+        
+        if current:
+            emit()
+        return chunks
+    
+    def _merge_small_chunks(self, chunks: List[Document]) -> Tuple[List[Document], List[int]]:
+        """
+        Merge chunks under MIN_CHUNK_TOKENS into the preceding chunk when the result fits in chunk_size.
+        
+        Only chunks from the same page are merged, so each chunk's page metadata stays accurate.
+        
+        Returns:
+            The merged chunks and the token count of each
+        """
+        merged: List[Document] = []
+        token_counts: List[int] = []
+        for chunk in chunks:
+            tokens = len(self.tokenizer.encode(chunk.page_content))
+            if (
+                merged
+                and tokens < MIN_CHUNK_TOKENS
+                and token_counts[-1] + tokens <= self.chunk_size
+                and merged[-1].metadata.get("page") == chunk.metadata.get("page")
+            ):
+                merged[-1].page_content += "\n" + chunk.page_content
+                token_counts[-1] += tokens
+                continue
+            merged.append(chunk)
+            token_counts.append(tokens)
+        return merged, token_counts
+    
     def process_pdf(
         self,
         pdf_path: Optional[Union[str, Path]] = None,
-        pdf_url: Optional[str] = None
+        pdf_url: Optional[str] = None,
+        pdf_bytes: Optional[bytes] = None,
+        source_name: Optional[str] = None
     ) -> List[Document]:
         """
-        Process a PDF file using LangChain's PyMuPDFLoader with OCR fallback.
+        Process a PDF file with PyMuPDF, falling back to OCR for low-text pages.
         
         Args:
             pdf_path: Path to local PDF file
             pdf_url: URL of PDF file
+            pdf_bytes: PDF content already in memory
+            source_name: Source recorded in chunk metadata; defaults to the URL or path
             
         Returns:
             List of LangChain Document objects
         """
-        if not pdf_path and not pdf_url:
-            raise ValueError("Either pdf_path or pdf_url must be provided")
+        if not pdf_path and not pdf_url and pdf_bytes is None:
+            raise ValueError("One of pdf_path, pdf_url or pdf_bytes must be provided")
 
-        # Initialize LangChain's PyMuPDFLoader
-        if pdf_url:
-            loader = PyMuPDFLoader(pdf_url)
-        else:
-            loader = PyMuPDFLoader(str(pdf_path))
+        source = source_name or pdf_url or (str(pdf_path) if pdf_path else "<bytes>")
         
-        # Load all pages using LangChain's loader
+        # Open the PDF once; its pages serve both text extraction and the OCR fallback
         try:
-            print("Loading PDF pages...")
-            initial_langchain_docs = loader.load()
-            print(f"Loaded {len(initial_langchain_docs)} pages from PDF")
+            logger.info("Loading PDF pages...")
+            if pdf_bytes is not None:
+                fitz_actual_doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+            elif pdf_url:
+                response = requests.get(pdf_url, timeout=30)
+                response.raise_for_status()
+                fitz_actual_doc = fitz.open(stream=response.content, filetype="pdf")
+            else:
+                fitz_actual_doc = fitz.open(str(pdf_path))
         except Exception as e:
-            print(f"Error loading PDF with PyMuPDFLoader: {e}")
-            return [] 
-
-        if not initial_langchain_docs:
+            logger.error("Error opening PDF with PyMuPDF: %s", e)
             return []
 
-        # Prepare for potential OCR fallback by opening the PDF with fitz
-        fitz_actual_doc = None
-        fitz_pages_for_ocr: List[fitz.Page] = []
-
-        # Check if OCR might be needed
-        ocr_potentially_needed = any(
-            len(doc.page_content.strip()) < self.text_threshold for doc in initial_langchain_docs
-        )
-
-        if ocr_potentially_needed:
-            try:
-                if pdf_url:
-                    response = requests.get(pdf_url, timeout=30)
-                    response.raise_for_status()
-                    fitz_actual_doc = fitz.open(stream=response.content, filetype="pdf")
-                else:
-                    fitz_actual_doc = fitz.open(str(pdf_path))
-                
-                if fitz_actual_doc:
-                    print("Loading pages for potential OCR...")
-                    for i in tqdm(range(len(fitz_actual_doc)), desc="Loading pages"):
-                        fitz_pages_for_ocr.append(fitz_actual_doc.load_page(i))
-            except Exception as e:
-                print(f"Could not open PDF with fitz for OCR fallback: {e}")
-
-        # Process each document (page) from LangChain loader, with OCR fallback
-        print("Processing pages...")
-        final_documents_for_splitting = []
-        for i, lc_doc in enumerate(tqdm(initial_langchain_docs, desc="Processing pages")):
-            page_content_to_use = lc_doc.page_content
-            
-            if len(lc_doc.page_content.strip()) < self.text_threshold and fitz_pages_for_ocr:
-                page_index = lc_doc.metadata.get('page')
+        total_pages = len(fitz_actual_doc)
+        logger.info("Loaded %s pages from PDF", total_pages)
+        if total_pages == 0:
+            fitz_actual_doc.close()
+            return []
 
-                if page_index is not None and 0 <= page_index < len(fitz_pages_for_ocr):
-                    fitz_page_for_ocr = fitz_pages_for_ocr[page_index]
-                    try:
-                        ocr_text = self._extract_text_with_ocr(fitz_page_for_ocr)
-                        if ocr_text.strip():
-                            page_content_to_use = ocr_text
-                    except Exception as e:
-                        print(f"Error during OCR for page {page_index}: {e}")
-                elif page_index is None:
-                    print(f"Warning: 'page' metadata not found in LangChain Document (source: {lc_doc.metadata.get('source')})")
-                else:
-                    print(f"Warning: Page index {page_index} out of bounds for OCR pages list")
+        # Extract the text layer of every page, noting the pages that need OCR
+        logger.info("Processing pages...")
+        initial_langchain_docs: List[Document] = []
+        page_blocks: List[List[str]] = []  # text blocks per page, used by block chunking
+        ocr_targets: List[int] = []  # indexes of pages that need OCR; loaded again only when rendered
+        for i, page in enumerate(tqdm(fitz_actual_doc, total=total_pages, desc="Processing pages")):
+            if not page.get_fonts():
+                # No fonts means no text layer (a scanned page); skip straight to OCR
+                if self.chunking == "blocks":
+                    page_blocks.append([])
+                text = ""
+            elif self.chunking == "blocks":
+                # (x0, y0, x1, y1, text, block_no, block_type); type 0 is text, 1 is an image
+                blocks = [block[4] for block in page.get_text("blocks") if block[6] == 0]
+                page_blocks.append(blocks)
+                text = "".join(blocks)
+            else:
+                text = page.get_text()
+            initial_langchain_docs.append(Document(
+                page_content=text,
+                metadata={"source": source, "file_path": source, "page": i, "total_pages": total_pages}
+            ))
+            if len(text.strip()) < self.text_threshold:
+                ocr_targets.append(i)
+        
+        if ocr_targets:
+            # PyMuPDF is not thread-safe, so pages are rendered here and only the OCR runs in threads.
+            # Each page is queued for OCR as soon as it is rendered, overlapping the two stages;
+            # a sliding window bounds how many rendered images are held in memory at once.
+            ocr_pool = _get_ocr_pool()
+            max_in_flight = settings.OCR_WORKERS * 2
+            in_flight: Deque[Future] = deque()
+            ocr_texts: List[str] = []
+            for i in tqdm(ocr_targets, desc="OCR"):
+                if len(in_flight) >= max_in_flight:
+                    ocr_texts.append(in_flight.popleft().result())
+                in_flight.append(
+                    ocr_pool.submit(self._ocr_image, self._render_page_for_ocr(fitz_actual_doc.load_page(i)))
+                )
+            ocr_texts.extend(future.result() for future in in_flight)
             
-            lc_doc.page_content = page_content_to_use
-            final_documents_for_splitting.append(lc_doc)
+            for i, ocr_text in zip(ocr_targets, ocr_texts):
+                if ocr_text.strip():
+                    initial_langchain_docs[i].page_content = ocr_text
+                    if page_blocks:
+                        # OCR output has no block layout; paragraphs stand in for blocks
+                        page_blocks[i] = [paragraph + "\n\n" for paragraph in ocr_text.split("\n\n")]
+        
+        final_documents_for_splitting = initial_langchain_docs
         
         # Split documents into chunks using token-based splitting
         if not final_documents_for_splitting:
             return []
             
-        print("Splitting documents into chunks...")
-        split_docs = self.text_splitter.split_documents(final_documents_for_splitting)
+        logger.info("Splitting documents into chunks...")
+        if self.chunking == "blocks":
+            split_docs = [
+                chunk
+                for page_doc, blocks in zip(final_documents_for_splitting, page_blocks)
+                for chunk in self._pack_blocks(page_doc, blocks)
+            ]
+        else:
+            split_docs = self.text_splitter.split_documents(final_documents_for_splitting)
         
-        # Clean up fitz document if it was opened
+        # Clean up the fitz document
         if fitz_actual_doc:
             try:
                 fitz_actual_doc.close()
             except Exception as e:
-                print(f"Error closing fitz_actual_doc: {e}")
+                logger.error("Error closing fitz_actual_doc: %s", e)
 
-        # Verify token counts in chunks
-        print("Verifying token counts...")
-        for i, doc in enumerate(tqdm(split_docs, desc="Verifying chunks")):
-            token_count = len(self.tokenizer.encode(doc.page_content))
+        # Fold tiny chunks into their neighbours; fewer chunks means fewer embeddings to request
+        chunk_count = len(split_docs)
+        split_docs, token_counts = self._merge_small_chunks(split_docs)
+        if len(split_docs) < chunk_count:
+            logger.info("Merged %s chunks under %s tokens", chunk_count - len(split_docs), MIN_CHUNK_TOKENS)
+        
+        # Verify token counts in chunks (counted during the merge pass)
+        logger.info("Verifying token counts...")
+        for i, token_count in enumerate(token_counts):
             if token_count > 8000:  # Gemini's embedding model limit
-                print(f"Warning: Chunk {i} has {token_count} tokens, which exceeds Gemini's limit")
+                logger.warning("Chunk %s has %s tokens, which exceeds Gemini's limit", i, token_count)
 
-        print(f"Successfully processed PDF into {len(split_docs)} chunks")
+        logger.info("Successfully processed PDF into %s chunks", len(split_docs))
         return split_docs
     
-    def generate_embeddings(self, documents: List[Document]) -> List[List[float]]:
+    def generate_embeddings(
+        self,
+        documents: List[Document],
+        batch_size: int = EMBEDDING_BATCH_SIZE
+    ) -> List[List[float]]:
         """
         Generate embeddings for a list of documents.
         
         Args:
             documents: List of LangChain Document objects
+            batch_size: Maximum number of texts sent per embedding request
             
         Returns:
             List of embedding vectors
         """
-        texts = [doc.page_content for doc in documents]
-        embeddings = self.embeddings.embed_documents(texts)
-        return embeddings 
\ No newline at end of file
+        # Identical chunks are embedded once and the vector is shared
+        texts, index_map = _dedupe_texts([doc.page_content for doc in documents])
+        embeddings: List[List[float]] = []
+        for batch in pack_batches(texts, max_items=batch_size):
+            for attempt in range(EMBEDDING_MAX_RETRIES + 1):
+                try:
+                    embeddings.extend(self.embeddings.embed_documents(batch))
+                    break
+                except Exception as e:
+                    if attempt == EMBEDDING_MAX_RETRIES or not _is_rate_limited(e):
+                        raise
+                    time.sleep(_backoff_delay(attempt))
+        return [embeddings[position] for position in index_map]
+    
+    async def agenerate_embeddings(
+        self,
+        documents: List[Document],
+        batch_size: int = EMBEDDING_BATCH_SIZE,
+        max_concurrency: int = EMBEDDING_MAX_CONCURRENCY
+    ) -> List[List[float]]:
+        """
+        Generate embeddings for a list of documents, sending batches concurrently.
+        
+        Args:
+            documents: List of LangChain Document objects
+            batch_size: Maximum number of texts sent per embedding request
+            max_concurrency: Maximum number of embedding requests in flight
+            
+        Returns:
+            List of embedding vectors, in the same order as documents
+        """
+        # Identical chunks are embedded once and the vector is shared
+        texts, index_map = _dedupe_texts([doc.page_content for doc in documents])
+        batches = list(pack_batches(texts, max_items=batch_size))
+        semaphore = asyncio.Semaphore(max_concurrency)
+        
+        async def embed_batch(batch: List[str]) -> List[List[float]]:
+            for attempt in range(EMBEDDING_MAX_RETRIES + 1):
+                async with semaphore:
+                    try:
+                        return await self.embeddings.aembed_documents(batch)
+                    except Exception as e:
+                        if attempt == EMBEDDING_MAX_RETRIES or not _is_rate_limited(e):
+                            raise
+                # Back off outside the semaphore so other batches can proceed
+                await asyncio.sleep(_backoff_delay(attempt))
+        
+        results = await asyncio.gather(*(embed_batch(batch) for batch in batches))
+        embeddings = [embedding for batch_embeddings in results for embedding in batch_embeddings]
+        return [embeddings[position] for position in index_map]
+
+
+# Per-process processor used by PDF parsing workers (see init_pdf_worker)
+_worker_processor: Optional[LangChainDocumentProcessor] = None
+
+def init_pdf_worker(
+    chunk_size: int,
+    chunk_overlap: int,
+    gemini_api_key: Optional[str] = None,
+    chunking: str = "tokens"
+) -> None:
+    """
+    Initializer for ProcessPoolExecutor workers.
+    
+    Builds one processor per worker process so the tokenizer and splitter are
+    loaded once, instead of pickling a processor (and its API clients) per task.
+    
+    Args:
+        chunk_size: Size of text chunks in tokens
+        chunk_overlap: Overlap between chunks in tokens
+        gemini_api_key: Google Gemini API key
+        chunking: Chunking strategy ("tokens" or "blocks")
+    """
+    global _worker_processor
+    # Forked workers inherit the parent's QueueHandler but not its listener thread;
+    # log straight to stderr instead so records aren't stranded in the copied queue
+    logging.basicConfig(level=logging.getLogger().level, force=True)
+    
+    _worker_processor = LangChainDocumentProcessor(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        gemini_api_key=gemini_api_key,
+        chunking=chunking
+    )
+
+def process_pdf_in_worker(pdf_path: str) -> List[Document]:
+    """
+    Parse and split a PDF inside a worker process started with init_pdf_worker.
+    
+    Args:
+        pdf_path: Path to local PDF file
+        
+    Returns:
+        List of LangChain Document objects
+    """
+    if _worker_processor is None:
+        raise RuntimeError("PDF worker was not initialized; use init_pdf_worker as the pool initializer")
+    return _worker_processor.process_pdf(pdf_path=pdf_path)
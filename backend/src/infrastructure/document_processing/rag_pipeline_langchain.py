@@ -1,22 +1,27 @@
 import os
 import uuid
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
 from google.cloud import storage
-from datetime import timedelta
+from google.api_core.exceptions import PreconditionFailed
+from functools import lru_cache
 from dotenv import load_dotenv
 from langchain_core.documents import Document
-from src.infrastructure.document_processing.langchain_processor import LangChainDocumentProcessor
-from src.infrastructure.vector_store.supabase_store import LangChainVectorStore
+from src.infrastructure.document_processing.pdf_processor import LangChainDocumentProcessor
+from src.infrastructure.vector_store.supabase_store import LangChainVectorStore, to_vector_literal, upload_chunk_size
+from src.infrastructure.cache.processed_document_cache import content_digest
 from src.infrastructure.gcp.gcp_credentials_loader import load_gcp_credentials
 import logging
 
 # Load environment variables
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # Load GCP credentials once at module level
 gcp_creds = load_gcp_credentials()
 if gcp_creds is None:
-    logging.warning("GCP credentials not loaded via gcp_credentials_loader. Relying on ADC or environment for storage.Client().")
+    logger.warning("GCP credentials not loaded via gcp_credentials_loader. Relying on ADC or environment for storage.Client().")
     # Depending on strictness, you might raise an error here if explicit creds are mandatory
     # raise EnvironmentError("Failed to load GCP credentials explicitly. Check gcp_credentials_loader.py and GOOGLE_APPLICATION_CREDENTIALS.")
 
@@ -26,25 +31,81 @@ SUPABASE_KEY_ENV = os.getenv("SUPABASE_KEY") # Renamed to avoid conflict with ar
 GCP_BUCKET_ENV = os.getenv("BUCKET")         # Renamed to avoid conflict
 gemini_api_key_env = os.getenv("GEMINI_API_KEY") # Renamed to avoid conflict
 
+@lru_cache(maxsize=1)
+def _get_storage_client() -> storage.Client:
+    """Return the module's GCS client, created on first use and reused by every upload."""
+    return storage.Client(credentials=gcp_creds)
+
 def upload_to_gcp(buffer: bytes, filename: str, destination: str) -> str:
-    """Uploads a file buffer to a specified GCP bucket and destination."""
+    """Uploads a file buffer to a specified GCP bucket and destination, reusing an identical earlier upload."""
     if not GCP_BUCKET_ENV:
         raise ValueError("GCP_BUCKET environment variable is not set.")
         
-    storage_client = storage.Client(credentials=gcp_creds)
-    bucket = storage_client.bucket(GCP_BUCKET_ENV)
-    full_path = f"{destination}/{filename}"
+    bucket = _get_storage_client().bucket(GCP_BUCKET_ENV)
+    # Content-addressed name: a re-run with the same PDF finds its blob already there
+    full_path = f"{destination}/{content_digest(buffer)}-{filename}"
 
     # Upload file
-    blob = bucket.blob(full_path)
-    blob.upload_from_string(buffer, content_type='application/pdf')
+    blob = bucket.blob(full_path, chunk_size=upload_chunk_size(len(buffer)))
+    try:
+        blob.upload_from_string(buffer, content_type='application/pdf', if_generation_match=0)
+    except PreconditionFailed:
+        logger.info("%s already exists; skipping upload.", full_path)
+
+    # The path is stored; signed URLs are generated when needed (LangChainVectorStore.signed_url_for)
+    return f"gs://{GCP_BUCKET_ENV}/{full_path}"
+
+def upload_file_to_gcp(file_path: str, filename: str, destination: str) -> str:
+    """Uploads a local file to a specified GCP bucket and destination, streaming it from disk and reusing an identical earlier upload."""
+    if not GCP_BUCKET_ENV:
+        raise ValueError("GCP_BUCKET environment variable is not set.")
+        
+    bucket = _get_storage_client().bucket(GCP_BUCKET_ENV)
+    full_path = f"{destination}/{content_digest(file_path)}-{filename}"
+
+    blob = bucket.blob(full_path, chunk_size=upload_chunk_size(os.path.getsize(file_path)))
+    try:
+        blob.upload_from_filename(file_path, content_type='application/pdf', if_generation_match=0)
+    except PreconditionFailed:
+        logger.info("%s already exists; skipping upload.", full_path)
 
-    # Generate signed URL for temporary access
-    url = blob.generate_signed_url(expiration=timedelta(minutes=15))
-    return url
+    return f"gs://{GCP_BUCKET_ENV}/{full_path}"
+
+def _process_and_embed(
+    buffer: Optional[bytes],
+    pdf_path: Optional[str],
+    original_name: str,
+    chunk_size: int,
+    gemini_api_key: str
+) -> Tuple[List[Document], List[List[float]]]:
+    """Split a PDF (buffer or file on disk) into chunks and embed them (steps 3-4 of process_document)."""
+    # Step 3: Process document using LangChain to get chunks
+    logger.info("Processing document with LangChain DocumentProcessor...")
+    processor = LangChainDocumentProcessor(
+        chunk_size=chunk_size,
+        gemini_api_key=gemini_api_key
+    )
+    
+    # Parse the buffer in memory, or let PyMuPDF read pages from disk as needed
+    if pdf_path is not None:
+        processed_documents: List[Document] = processor.process_pdf(pdf_path=pdf_path)
+    else:
+        processed_documents = processor.process_pdf(pdf_bytes=buffer, source_name=original_name)
+    logger.info("Created %s chunks from PDF.", len(processed_documents))
+    
+    # Step 4: Generate Embeddings for these chunks
+    logger.info("Generating embeddings for documents...")
+    if not processed_documents:
+        logger.warning("No documents processed, skipping embedding generation and insertion.")
+        document_embeddings = []
+    else:
+        document_embeddings = processor.generate_embeddings(processed_documents)
+        logger.info("Generated %s embeddings.", len(document_embeddings))
+    
+    return processed_documents, document_embeddings
 
 def process_document(
-    buffer: bytes,
+    buffer: Optional[bytes],
     original_name: str,
     files_table_name: str, # Clarified: this is for the 'files' metadata table
     supabase_url: str,
@@ -52,13 +113,14 @@ def process_document(
     chunk_size: int,
     gcp_destination_folder: str, # Clarified name
     # model: str, # model arg was unused, can be removed if not planned for future use
-    gemini_api_key_param: str # Clarified name
+    gemini_api_key_param: str, # Clarified name
+    pdf_path: Optional[str] = None
 ) -> Dict[str, Any]:
     """
     Process a document using LangChain components.
     
     Args:
-        buffer: PDF file content as bytes
+        buffer: PDF file content as bytes; may be None when pdf_path is given
         original_name: Original filename
         files_table_name: Supabase table name for file metadata (e.g., 'files')
         supabase_url: Supabase project URL
@@ -66,18 +128,20 @@ def process_document(
         chunk_size: Size of text chunks
         gcp_destination_folder: GCP destination folder
         gemini_api_key_param: Google Gemini API key for processing
+        pdf_path: Optional path of the PDF on disk; when given the file is parsed
+            and uploaded straight from disk instead of from buffer
         
     Returns:
         Dictionary containing processing results
     """
     # Debug: Print type and snippet of buffer at the beginning of process_document
-    print(f"DEBUG: process_document received buffer type: {type(buffer)}")
+    logger.debug("process_document received buffer type: %s", type(buffer))
     if isinstance(buffer, bytes):
-        print(f"DEBUG: process_document received buffer snippet (first 100 bytes): {buffer[:100]}")
+        logger.debug("process_document received buffer snippet (first 100 bytes): %s", buffer[:100])
     elif isinstance(buffer, str):
-        print(f"DEBUG: process_document received string buffer snippet (first 100 chars): {buffer[:100]}")
+        logger.debug("process_document received string buffer snippet (first 100 chars): %s", buffer[:100])
     else:
-        print(f"DEBUG: process_document received buffer of unexpected type: {type(buffer)}, value: {buffer}")
+        logger.debug("process_document received buffer of unexpected type: %s, value: %s", type(buffer), buffer)
 
     # Check required global variables (using renamed env vars to avoid confusion with params)
     if not SUPABASE_URL_ENV or not SUPABASE_KEY_ENV or not GCP_BUCKET_ENV or not gemini_api_key_env:
@@ -91,23 +155,32 @@ def process_document(
         if missing:
             raise ValueError(f"Missing required variables/parameters for processing: {', '.join(missing)}")
 
+    # Steps 3-4 (parsing, OCR and embedding) don't depend on the upload, so run them
+    # in a worker thread while steps 1-2 proceed here
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="process_document")
+    processing = executor.submit(_process_and_embed, buffer, pdf_path, original_name, chunk_size, gemini_api_key_param)
+    executor.shutdown(wait=False)  # The submitted job still runs; no further work is accepted
+    
     # Step 1: Upload to GCP
-    print("📤 Uploading file to GCP...")
+    logger.info("Uploading file to GCP...")
     file_extension = os.path.splitext(original_name)[1] if os.path.splitext(original_name)[1] else '.pdf'
-    # Using a simpler UUID for the filename, the db_file_id will be the true unique ID for the file entity
-    gcp_unique_filename = f"{os.path.splitext(original_name)[0]}_{uuid.uuid4().hex[:8]}{file_extension}"
+    # The upload prefixes a content hash, so the name needs no random suffix to be unique
+    gcp_unique_filename = f"{os.path.splitext(original_name)[0]}{file_extension}"
     
     # Debug: Print type and snippet of buffer just before calling upload_to_gcp
-    print(f"DEBUG: Before upload_to_gcp, buffer type: {type(buffer)}")
+    logger.debug("Before upload_to_gcp, buffer type: %s", type(buffer))
     if isinstance(buffer, bytes):
-        print(f"DEBUG: Before upload_to_gcp, buffer snippet (first 100 bytes): {buffer[:100]}")
+        logger.debug("Before upload_to_gcp, buffer snippet (first 100 bytes): %s", buffer[:100])
     elif isinstance(buffer, str):
-        print(f"DEBUG: Before upload_to_gcp, string buffer snippet (first 100 chars): {buffer[:100]}")
+        logger.debug("Before upload_to_gcp, string buffer snippet (first 100 chars): %s", buffer[:100])
     else:
-        print(f"DEBUG: Before upload_to_gcp, buffer of unexpected type: {type(buffer)}, value: {buffer}")
+        logger.debug("Before upload_to_gcp, buffer of unexpected type: %s, value: %s", type(buffer), buffer)
         
-    gcp_url = upload_to_gcp(buffer, gcp_unique_filename, gcp_destination_folder)
-    print(f"✅ Uploaded to GCP: {gcp_url}")
+    if pdf_path is not None:
+        gcp_url = upload_file_to_gcp(pdf_path, gcp_unique_filename, gcp_destination_folder)
+    else:
+        gcp_url = upload_to_gcp(buffer, gcp_unique_filename, gcp_destination_folder)
+    logger.info("Uploaded to GCP: %s", gcp_url)
 
     # Initialize LangChainVectorStore. 
     # Its internal self.table_name will default to "chunks" or be set by SUPABASE_TABLE env var if LangChainVectorStore reads it.
@@ -121,104 +194,47 @@ def process_document(
     )
     # The actual chunks table name we'll insert into is vector_store_wrapper.table_name
     chunks_table_for_insertion = vector_store_wrapper.table_name 
-    print(f"ℹ️ Chunks will be inserted into table: '{chunks_table_for_insertion}'")
+    logger.info("Chunks will be inserted into table: '%s'", chunks_table_for_insertion)
 
-    # Step 2: Insert file metadata to Supabase 'files' table
-    print(f"📝 Inserting file record into Supabase table: '{files_table_name}'...")
-    # Generate a true UUID for the file ID in the database
-    db_file_id = str(uuid.uuid4()) 
+    # Step 2: Prepare the file record for the Supabase 'files' table (the database generates its ID)
     file_metadata = {
-        "id": db_file_id,
         "title": original_name,
         "link": gcp_url,
         "license": "unknown",
         "in_database": True
     }
 
-    # Insert metadata into the specified 'files_table_name'
-    response = vector_store_wrapper.supabase.table(files_table_name).insert(file_metadata).execute()
-    # Check if response indicates success and if data is present
-    if not (hasattr(response, 'data') and response.data and len(response.data) > 0):
-        # Attempt to get more detailed error if available from Postgrest
-        error_message = "Failed to insert file metadata into Supabase or no data returned."
-        if hasattr(response, 'error') and response.error:
-            error_message += f" DB Error: {response.error.message if hasattr(response.error, 'message') else response.error}"
-        raise Exception(error_message)
+    # Wait for the chunks and embeddings computed alongside step 1
+    processed_documents, document_embeddings = processing.result()
     
-    # It's safer to use the db_file_id we generated, as insert_file_metadata in the test script did.
-    # However, if the table has a default for 'id' or a trigger, response.data[0].get("id") could be different.
-    # For consistency with the pattern of generating UUID in app code:
-    actual_inserted_file_id = response.data[0].get("id", db_file_id)
-    if actual_inserted_file_id != db_file_id:
-        print(f"⚠️ DB returned ID '{actual_inserted_file_id}' for file metadata, but generated ID was '{db_file_id}'. Using DB-returned ID.")
-        db_file_id = actual_inserted_file_id
-    print(f"✅ Inserted file record. File ID for 'chunks.fileId': {db_file_id}")
-
-    # Step 3: Process document using LangChain to get chunks
-    print("📄 Processing document with LangChain DocumentProcessor...")
-    processor = LangChainDocumentProcessor(
-        chunk_size=chunk_size,
-        gemini_api_key=gemini_api_key_param # Use the passed API key
-    )
-    
-    # Save buffer to temporary file for LangChainDocumentProcessor.process_pdf (which expects a path)
-    temp_pdf_path = f"/tmp/{gcp_unique_filename}" # Use the same unique name for temp file
-    with open(temp_pdf_path, "wb") as f:
-        f.write(buffer)
+    if processed_documents and not document_embeddings:
+        logger.warning("Processed documents but no embeddings generated. No chunks inserted.")
+        processed_documents = []
+    elif not processed_documents:
+        logger.info("No chunks were processed or generated, so no chunks were inserted.")
     
-    processed_documents: List[Document] = []
-    try:
-        processed_documents = processor.process_pdf(pdf_path=temp_pdf_path)
-        print(f"✅ Created {len(processed_documents)} chunks from PDF.")
-        
-        # Step 4: Generate Embeddings for these chunks
-        print("🧠 Generating embeddings for documents...")
-        if not processed_documents:
-            print("⚠️ No documents processed, skipping embedding generation and insertion.")
-            document_embeddings = []
-        else:
-            document_embeddings = processor.generate_embeddings(processed_documents)
-            print(f"✅ Generated {len(document_embeddings)} embeddings.")
-        
-        # Step 5: Manually insert chunks and their embeddings into the Supabase 'chunks' table
-        if processed_documents and document_embeddings:
-            print(f"⬆️ Inserting {len(processed_documents)} chunks into Supabase table '{chunks_table_for_insertion}'...")
-            for i, (doc, embedding_vector) in enumerate(zip(processed_documents, document_embeddings)):
-                chunk_uuid = str(uuid.uuid4())  # Unique ID for each chunk
-                chunk_data_to_insert = {
-                    "id": chunk_uuid,
-                    "fileId": db_file_id,  # Foreign key from 'files' table
-                "position": i,
-                "originalName": original_name,
-                    "content": doc.page_content,  # Text content of the chunk
-                    "downloadUrl": gcp_url,      # URL of the original PDF in GCP
-                    "embedding": embedding_vector # The generated embedding
-                }
-                try:
-                    vector_store_wrapper.supabase.table(chunks_table_for_insertion).insert(chunk_data_to_insert).execute()
-                except Exception as e_insert_chunk:
-                    print(f"❌ ERROR inserting chunk {i} (ID: {chunk_uuid}): {e_insert_chunk}")
-                    # Decide on error handling: continue, or re-raise to stop all processing?
-                    # For now, re-raising to indicate failure of the overall process_document.
-                    raise Exception(f"Failed to insert chunk {i} (ID: {chunk_uuid}). Original error: {e_insert_chunk}") 
-                
-                # Optional: print progress for long uploads
-                if (i + 1) % 20 == 0 or (i + 1) == len(processed_documents):
-                     print(f"   ...stored chunk {i + 1}/{len(processed_documents)}")
-            print(f"✅ All {len(processed_documents)} chunks and embeddings inserted into '{chunks_table_for_insertion}'.")
-        elif not processed_documents:
-            print("ℹ️ No chunks were processed or generated, so no chunks were inserted.")
-        else:
-            print("⚠️ Processed documents but no embeddings generated, or vice-versa. No chunks inserted.")
-        
-    finally:
-        # Clean up temporary file
-        if os.path.exists(temp_pdf_path):
-            os.remove(temp_pdf_path)
-            print(f"🗑️ Cleaned up temporary file: {temp_pdf_path}")
+    # Step 5: Insert the file record and its chunks (with embeddings) together.
+    # One RPC and one transaction: a failed chunk insert leaves no orphaned file row.
+    # The function inserts into the 'files' table; files_table_name must match it.
+    if files_table_name != "files":
+        logger.warning("insert_document_with_chunks writes to 'files', not '%s'.", files_table_name)
+    logger.info("Inserting file record and %s chunks into '%s'...", len(processed_documents), chunks_table_for_insertion)
+    rows = [
+        {
+            "id": str(uuid.uuid4()),  # Unique ID for each chunk
+            "position": i,
+            "originalName": original_name,
+            "content": doc.page_content,  # Text content of the chunk
+            "downloadUrl": gcp_url,      # URL of the original PDF in GCP
+            "embedding": to_vector_literal(embedding_vector) # The generated embedding
+        }
+        for i, (doc, embedding_vector) in enumerate(zip(processed_documents, document_embeddings))
+    ]
+    db_file_id = vector_store_wrapper.insert_document_with_chunks(file_metadata, rows)
+    logger.info("Inserted file record %s and %s chunks.", db_file_id, len(rows))
     
     return {
-        "file_url": gcp_url,
+        "file_url": vector_store_wrapper.signed_url_for(gcp_url),
         "file_id": db_file_id, # Return the actual ID used for fileId in chunks
         "total_chunks": len(processed_documents)
     } 
\ No newline at end of file
@@ -1,9 +1,18 @@
 # gcp_credentials_loader.py
 import os
 import json
+import logging
 import google.auth
 from google.oauth2 import service_account
 import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Credentials loaded successfully once are reused for the life of the process;
+# they refresh their own access tokens. Failures are not cached so a later call can retry.
+_cached_credentials = None
+_cache_lock = threading.Lock()
 
 def load_gcp_credentials():
     """
@@ -11,10 +20,20 @@ def load_gcp_credentials():
     1. GOOGLE_APPLICATION_CREDENTIALS env var (path to JSON file)
     2. GOOGLE_APPLICATION_CREDENTIALS_JSON env var (JSON content)
 
+    The first successfully loaded credentials are memoized for the process.
+
     Returns:
         google.auth.credentials.Credentials or None: The loaded credentials object,
                                                     or None if loading failed.
     """
+    global _cached_credentials
+    with _cache_lock:
+        if _cached_credentials is None:
+            _cached_credentials = _load_gcp_credentials()
+        return _cached_credentials
+
+def _load_gcp_credentials():
+    """Load GCP credentials without caching (see load_gcp_credentials)."""
     try:
         # First try: Check if JSON content is provided directly
         json_content = os.getenv("GOOGLE_APPLICATION_CREDENTIALS_JSON")
@@ -23,22 +42,22 @@ def load_gcp_credentials():
                 # Parse the JSON content
                 json_data = json.loads(json_content)
                 credentials = service_account.Credentials.from_service_account_info(json_data)
-                print("Successfully loaded GCP credentials from JSON content.")
+                logger.info("Successfully loaded GCP credentials from JSON content.")
                 return credentials
             except Exception as e:
-                print(f"Error loading credentials from JSON content: {e}")
+                logger.error("Error loading credentials from JSON content: %s", e)
 
         # Second try: Use google.auth.default() which handles GOOGLE_APPLICATION_CREDENTIALS
         try:
             credentials, project = google.auth.default()
-            print("Successfully loaded GCP credentials from default location.")
+            logger.info("Successfully loaded GCP credentials from default location.")
             return credentials
         except Exception as e:
-            print(f"Error loading credentials from default location: {e}")
+            logger.error("Error loading credentials from default location: %s", e)
 
         # If both methods fail, return None
-        print("Failed to load GCP credentials from both JSON content and default location.")
+        logger.error("Failed to load GCP credentials from both JSON content and default location.")
         return None
     except Exception as e:
-        print(f"Unexpected error loading GCP credentials: {e}")
+        logger.error("Unexpected error loading GCP credentials: %s", e)
         return None
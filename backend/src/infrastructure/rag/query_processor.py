@@ -1,4 +1,4 @@
-from typing import List, Dict, Any, Optional
+from typing import Callable, List, Dict, Any, Optional, Sequence, Tuple
 from enum import Enum
 from langchain_core.documents import Document
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
@@ -7,11 +7,13 @@ from langchain_core.runnables import RunnablePassthrough
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.memory import ConversationBufferMemory
 from langchain.chains import ConversationalRetrievalChain
-from src.infrastructure.vector_store.supabase_store import LangChainVectorStore
+from src.infrastructure.vector_store.supabase_store import LangChainVectorStore, RRF_K_DEFAULT
+import asyncio
 import os
 from dotenv import load_dotenv
-from langchain.schema import BaseMessage
+from langchain.schema import AIMessage, BaseMessage, HumanMessage
 from langchain.chains.conversational_retrieval.base import _get_chat_history
+from langchain_core.pydantic_v1 import PrivateAttr
 
 # Load environment variables
 load_dotenv()
@@ -60,6 +62,28 @@ Examples of good behavior:
   Response: Generate 3–5 quiz questions with one correct answer each."""
 }
 
+class SerializedConversationMemory(ConversationBufferMemory):
+    """ConversationBufferMemory that also keeps the history as a ready-to-return list of dicts."""
+    
+    _serialized: List[Dict[str, str]] = PrivateAttr(default_factory=list)
+    
+    @property
+    def serialized(self) -> List[Dict[str, str]]:
+        """History as [{"role": "user"|"assistant", "content": ...}], updated on every save."""
+        return self._serialized
+    
+    def save_context(self, inputs: Dict[str, Any], outputs: Dict[str, str]) -> None:
+        """Save the exchange to the buffer and append it to the serialized history."""
+        super().save_context(inputs, outputs)
+        input_str, output_str = self._get_input_output(inputs, outputs)
+        self._serialized.append({"role": "user", "content": input_str})
+        self._serialized.append({"role": "assistant", "content": output_str})
+    
+    def clear(self) -> None:
+        """Clear the buffer and the serialized history."""
+        super().clear()
+        self._serialized.clear()
+
 class LangChainRAGChain:
     """RAG pipeline implementation using LangChain's chains."""
     
@@ -96,8 +120,11 @@ class LangChainRAGChain:
             convert_system_message_to_human=True
         )
         
+        # Shares the store's query embedding cache, so repeated questions skip Gemini
+        self.embed_query: Callable[[str], Tuple[float, ...]] = vector_store.embed_query
+        
         # Initialize conversation memory
-        self.memory = ConversationBufferMemory(
+        self.memory = SerializedConversationMemory(
             memory_key="chat_history",
             return_messages=True
         )
@@ -145,11 +172,94 @@ class LangChainRAGChain:
         
         return chain
     
+    def _answer(
+        self,
+        question: str,
+        search_results: List[Dict[str, Any]],
+        conversation_history: Optional[List[Dict[str, str]]] = None
+    ) -> Dict[str, Any]:
+        """
+        Generate an answer from hybrid search results.
+        
+        Args:
+            question: The question to ask
+            search_results: Rows returned by hybrid search
+            conversation_history: Optional client-managed history (see query)
+            
+        Returns:
+            Dictionary containing the answer and source documents
+        """
+        if not search_results:
+            return {
+                "answer": "Could not find relevant information in the specified document.",
+                "source_documents": []
+            }
+        
+        documents = [
+            Document(
+                page_content=result["content"],
+                metadata={
+                    "id": result.get("id"),
+                    "fileId": result.get("fileId"),
+                    "position": result.get("position"),
+                    "originalName": result.get("originalName"),
+                    "downloadUrl": result.get("downloadUrl")
+                }
+            )
+            for result in search_results
+        ]
+        
+        # 2. Get current chat history
+        current_chat_history_messages: List[BaseMessage]
+        if conversation_history is not None:
+            current_chat_history_messages = [
+                AIMessage(content=message.get("content", "")) if message.get("role") == "assistant"
+                else HumanMessage(content=message.get("content", ""))
+                for message in conversation_history
+            ]
+        else:
+            current_chat_history_messages = self.memory.chat_memory.messages
+
+        # 3. Generate standalone question if history exists
+        new_question = question
+        if current_chat_history_messages:
+            chat_history_str = _get_chat_history(current_chat_history_messages)
+            # The question_generator is an LLMChain, its output_key is typically 'text'
+            question_generator_output = self.chain.question_generator.invoke({
+                "question": question,
+                "chat_history": chat_history_str
+            })
+            new_question = question_generator_output[self.chain.question_generator.output_key]
+
+        # 4. Invoke combine_docs_chain with our documents and the (new) question
+        combine_docs_input = {
+            "input_documents": documents,
+            "question": new_question,
+            "chat_history": current_chat_history_messages
+        }
+        
+        generated_response = self.chain.combine_docs_chain.invoke(combine_docs_input)
+        final_answer = generated_response[self.chain.combine_docs_chain.output_key]
+        
+        # 5. Manually update memory (client-managed history is left to the client)
+        if conversation_history is None:
+            self.memory.save_context(
+                {"question": question},
+                {"answer": final_answer}
+            )
+        
+        return {
+            "answer": final_answer,
+            "source_documents": documents
+        }
+    
     def query(
         self,
         question: str,
         file_title: Optional[str] = None,
-        mode: Optional[PromptMode] = None
+        mode: Optional[PromptMode] = None,
+        query_embedding: Optional[Sequence[float]] = None,
+        conversation_history: Optional[List[Dict[str, str]]] = None
     ) -> Dict[str, Any]:
         """
         Query the RAG chain with a question.
@@ -158,6 +268,10 @@ class LangChainRAGChain:
             question: The question to ask
             file_title: Optional file title to filter results
             mode: Optional mode to temporarily use for this query
+            query_embedding: Optional precomputed embedding of the question
+            conversation_history: Optional client-managed history as a list of
+                {"role", "content"} dicts; when given it replaces the chain's
+                memory for this query and the exchange is not saved to memory
             
         Returns:
             Dictionary containing the answer and source documents
@@ -170,7 +284,8 @@ class LangChainRAGChain:
 
         try:
             # 1. Perform hybrid search to get documents
-            query_embedding = self.vector_store.embeddings.embed_query(question)
+            if query_embedding is None:
+                query_embedding = self.embed_query(question)
             
             search_results = self.vector_store.hybrid_search(
                 query=question,
@@ -178,65 +293,77 @@ class LangChainRAGChain:
                 match_count=10,
                 full_text_weight=1.0,
                 semantic_weight=1.0,
-                rrf_k=50,
+                rrf_k=RRF_K_DEFAULT,
                 file_title=file_title or ""
             )
             
-            if not search_results:
-                return {
-                    "answer": "Could not find relevant information in the specified document.",
-                    "source_documents": []
-                }
-            
-            documents = [
-                Document(
-                    page_content=result["content"],
-                    metadata={
-                        "id": result.get("id"),
-                        "fileId": result.get("fileId"),
-                        "position": result.get("position"),
-                        "originalName": result.get("originalName"),
-                        "downloadUrl": result.get("downloadUrl")
-                    }
-                )
-                for result in search_results
-            ]
-            
-            # 2. Get current chat history
-            current_chat_history_messages: List[BaseMessage] = self.memory.chat_memory.messages
-
-            # 3. Generate standalone question if history exists
-            new_question = question
-            if current_chat_history_messages:
-                chat_history_str = _get_chat_history(current_chat_history_messages)
-                # The question_generator is an LLMChain, its output_key is typically 'text'
-                question_generator_output = self.chain.question_generator.invoke({
-                    "question": question,
-                    "chat_history": chat_history_str
-                })
-                new_question = question_generator_output[self.chain.question_generator.output_key]
-
-            # 4. Invoke combine_docs_chain with our documents and the (new) question
-            combine_docs_input = {
-                "input_documents": documents,
-                "question": new_question,
-                "chat_history": current_chat_history_messages
-            }
-            
-            generated_response = self.chain.combine_docs_chain.invoke(combine_docs_input)
-            final_answer = generated_response[self.chain.combine_docs_chain.output_key]
-            
-            # 5. Manually update memory
-            self.memory.save_context(
-                {"question": question},
-                {"answer": final_answer}
-            )
-            
-            return {
-                "answer": final_answer,
-                "source_documents": documents
-            }
+            return self._answer(question, search_results, conversation_history)
         finally:
             # Switch back to original mode if we changed it
             if original_mode is not None:
-                self.set_mode(original_mode) 
\ No newline at end of file
+                self.set_mode(original_mode)
+    
+    def query_with_embedding(
+        self,
+        question: str,
+        query_embedding: Sequence[float],
+        file_title: Optional[str] = None,
+        mode: Optional[PromptMode] = None,
+        conversation_history: Optional[List[Dict[str, str]]] = None
+    ) -> Dict[str, Any]:
+        """
+        Query the RAG chain with a question whose embedding is already known.
+        
+        Args:
+            question: The question to ask
+            query_embedding: Precomputed embedding of the question
+            file_title: Optional file title to filter results
+            mode: Optional mode to temporarily use for this query
+            conversation_history: Optional client-managed history (see query)
+            
+        Returns:
+            Dictionary containing the answer and source documents
+        """
+        return self.query(
+            question=question,
+            file_title=file_title,
+            mode=mode,
+            query_embedding=query_embedding,
+            conversation_history=conversation_history
+        )
+    
+    async def aquery(
+        self,
+        question: str,
+        query_embedding: Sequence[float],
+        file_title: Optional[str] = None,
+        conversation_history: Optional[List[Dict[str, str]]] = None,
+        file_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Async variant of query_with_embedding that keeps the event loop free.
+        
+        The hybrid search goes over the store's asyncpg pool when one is open;
+        answer generation runs in a worker thread.
+        
+        Args:
+            question: The question to ask
+            query_embedding: Precomputed embedding of the question
+            file_title: Optional file title to filter results
+            conversation_history: Optional client-managed history (see query)
+            file_id: Optional file ID to filter results; cheaper than file_title
+            
+        Returns:
+            Dictionary containing the answer and source documents
+        """
+        search_results = await self.vector_store.ahybrid_search(
+            query=question,
+            query_embedding=query_embedding,
+            match_count=10,
+            full_text_weight=1.0,
+            semantic_weight=1.0,
+            rrf_k=RRF_K_DEFAULT,
+            file_title=file_title or "",
+            file_id=file_id
+        )
+        return await asyncio.to_thread(self._answer, question, search_results, conversation_history)
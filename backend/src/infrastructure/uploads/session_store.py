@@ -0,0 +1,202 @@
+from typing import Any, Dict, List, Optional, Set
+import asyncio
+import json
+import time
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # Optional: without it sessions live in the worker's memory
+    aioredis = None
+
+
+class UploadSessionStore:
+    """
+    In-process store of chunked upload sessions.
+
+    Only correct while a single worker serves every request of an upload; use
+    RedisUploadSessionStore when running with several workers.
+    """
+
+    def __init__(self):
+        # upload_id -> session fields plus the set of received chunk indexes
+        self._sessions: Dict[str, Dict[str, Any]] = {}
+        self._chunks: Dict[str, Set[int]] = {}
+        self._lock = asyncio.Lock()
+
+    async def create(self, upload_id: str, session: Dict[str, Any]) -> None:
+        """
+        Register a new upload session.
+
+        Args:
+            upload_id: ID of the upload
+            session: Session fields; must include expires_at (epoch seconds)
+        """
+        async with self._lock:
+            self._sessions[upload_id] = {**session, "is_complete": False}
+            self._chunks[upload_id] = set()
+
+    async def get(self, upload_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Return a copy of an upload session with its chunks_received count.
+
+        Args:
+            upload_id: ID of the upload
+
+        Returns:
+            The session, or None if it does not exist
+        """
+        async with self._lock:
+            session = self._sessions.get(upload_id)
+            if session is None:
+                return None
+            return {**session, "chunks_received": len(self._chunks[upload_id])}
+
+    async def record_chunk(self, upload_id: str, chunk_index: int) -> int:
+        """
+        Mark a chunk as received; re-sent chunks are only counted once.
+
+        Args:
+            upload_id: ID of the upload
+            chunk_index: Index of the received chunk
+
+        Returns:
+            Number of distinct chunks received so far
+        """
+        async with self._lock:
+            chunks = self._chunks.setdefault(upload_id, set())
+            chunks.add(chunk_index)
+            return len(chunks)
+
+    async def mark_complete(self, upload_id: str) -> bool:
+        """
+        Mark an upload as finalized.
+
+        Returns:
+            True if this call finalized the upload, False if it was already finalized
+        """
+        async with self._lock:
+            session = self._sessions.get(upload_id)
+            if session is None or session["is_complete"]:
+                return False
+            session["is_complete"] = True
+            return True
+
+    async def delete(self, upload_id: str) -> None:
+        """Remove an upload session."""
+        async with self._lock:
+            self._sessions.pop(upload_id, None)
+            self._chunks.pop(upload_id, None)
+
+    async def pop_expired(self, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Remove and return every session whose expires_at has passed.
+
+        Args:
+            now: Current epoch time; defaults to time.time()
+
+        Returns:
+            The removed sessions, each with its upload_id
+        """
+        now = time.time() if now is None else now
+        async with self._lock:
+            expired = [upload_id for upload_id, session in self._sessions.items() if session["expires_at"] < now]
+            removed = []
+            for upload_id in expired:
+                removed.append({**self._sessions.pop(upload_id), "upload_id": upload_id})
+                self._chunks.pop(upload_id, None)
+            return removed
+
+    async def close(self) -> None:
+        """Release any resources held by the store."""
+
+
+class RedisUploadSessionStore(UploadSessionStore):
+    """
+    Upload session store shared by all workers through Redis.
+
+    Each session uses three keys: a hash with the session fields, a bitmap of
+    received chunk indexes and a counter of distinct chunks. A sorted set of
+    upload IDs by expiry lets any worker reap abandoned uploads. Keys outlive
+    expires_at by a grace period so the reaper can still read temp_dir.
+    """
+
+    EXPIRY_KEY = "uploads:expiry"
+
+    def __init__(self, url: str, grace_period: int = 3600):
+        """
+        Initialize the Redis-backed store.
+
+        Args:
+            url: Redis connection URL, e.g. redis://localhost:6379/0
+            grace_period: Seconds the keys are kept after the session expires
+        """
+        if aioredis is None:
+            raise ImportError("redis is required for REDIS_URL; install it with 'pip install redis'")
+        self._redis = aioredis.from_url(url, decode_responses=True)
+        self.grace_period = grace_period
+
+    @staticmethod
+    def _keys(upload_id: str) -> tuple:
+        return f"upload:{upload_id}", f"upload:{upload_id}:chunks", f"upload:{upload_id}:received"
+
+    async def create(self, upload_id: str, session: Dict[str, Any]) -> None:
+        session_key, _, received_key = self._keys(upload_id)
+        ttl = max(1, int(session["expires_at"] - time.time()) + self.grace_period)
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.hset(session_key, mapping={"data": json.dumps(session), "is_complete": 0})
+            pipe.expire(session_key, ttl)
+            pipe.set(received_key, 0, ex=ttl)
+            pipe.zadd(self.EXPIRY_KEY, {upload_id: session["expires_at"]})
+            await pipe.execute()
+
+    async def get(self, upload_id: str) -> Optional[Dict[str, Any]]:
+        session_key, _, received_key = self._keys(upload_id)
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.hgetall(session_key)
+            pipe.get(received_key)
+            fields, received = await pipe.execute()
+        if not fields:
+            return None
+        session = json.loads(fields["data"])
+        session["is_complete"] = fields.get("is_complete", "0") != "0"
+        session["chunks_received"] = int(received or 0)
+        return session
+
+    async def record_chunk(self, upload_id: str, chunk_index: int) -> int:
+        session_key, chunks_key, received_key = self._keys(upload_id)
+        # SETBIT returns the previous bit, so only the first receipt of a chunk is counted
+        if await self._redis.setbit(chunks_key, chunk_index, 1):
+            return int(await self._redis.get(received_key) or 0)
+        ttl = await self._redis.ttl(session_key)
+        if ttl > 0:
+            await self._redis.expire(chunks_key, ttl)
+        return int(await self._redis.incr(received_key))
+
+    async def mark_complete(self, upload_id: str) -> bool:
+        session_key, _, _ = self._keys(upload_id)
+        if not await self._redis.exists(session_key):
+            return False
+        # HINCRBY is atomic: exactly one finalize request sees the flag go from 0 to 1
+        return await self._redis.hincrby(session_key, "is_complete", 1) == 1
+
+    async def delete(self, upload_id: str) -> None:
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.delete(*self._keys(upload_id))
+            pipe.zrem(self.EXPIRY_KEY, upload_id)
+            await pipe.execute()
+
+    async def pop_expired(self, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        now = time.time() if now is None else now
+        removed = []
+        for upload_id in await self._redis.zrangebyscore(self.EXPIRY_KEY, "-inf", now):
+            # ZREM succeeds for exactly one worker, which then owns the cleanup
+            if not await self._redis.zrem(self.EXPIRY_KEY, upload_id):
+                continue
+            session = await self.get(upload_id)
+            await self._redis.delete(*self._keys(upload_id))
+            if session is not None:
+                removed.append({**session, "upload_id": upload_id})
+        return removed
+
+    async def close(self) -> None:
+        await self._redis.aclose()
@@ -1,19 +1,118 @@
-from typing import List, Dict, Any, Optional
+from typing import Callable, List, Dict, Any, Optional, BinaryIO, Sequence, Tuple, Union
 from langchain_community.vectorstores import SupabaseVectorStore
+from langchain_community.vectorstores.utils import maximal_marginal_relevance
 from langchain_core.documents import Document
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
+import google.generativeai as genai
 from supabase.client import Client, create_client
 from google.cloud import storage
+from google.cloud.storage import transfer_manager
+from google.api_core.exceptions import PreconditionFailed
 from datetime import timedelta
+from functools import cached_property, lru_cache
+from concurrent.futures import ThreadPoolExecutor
+import io
+import json
 import os
+import random
+import threading
+import time
 from dotenv import load_dotenv
 import uuid
+import asyncio
+import logging
+import numpy as np
 from ...infrastructure.gcp.gcp_credentials_loader import load_gcp_credentials
+from ...infrastructure.document_processing.embedding_batches import pack_batches
+from ...infrastructure.cache.processed_document_cache import content_digest
+
+try:
+    import asyncpg
+except ImportError:  # Optional: without it async methods fall back to the Supabase REST client
+    asyncpg = None
 from tqdm import tqdm
+from cachetools import TTLCache
 
 # Load environment variables
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Files above this size are uploaded as concurrent multipart chunks.
+# GCS XML multipart uploads require every part except the last to be at least 5MiB.
+PARALLEL_UPLOAD_THRESHOLD = 5 * 1024 * 1024
+PARALLEL_UPLOAD_CHUNK_SIZE = 5 * 1024 * 1024
+PARALLEL_UPLOAD_WORKERS = 4
+# Large uploads stream from disk for a while; the library default of 60s is too short
+GCP_UPLOAD_TIMEOUT = 600
+# Rows per bulk_insert_chunks call; with ~6KB embedding literals plus chunk text
+# this keeps each request body around a few MB
+BULK_INSERT_MAX_ROWS = 500
+# Reciprocal rank fusion constant: 60 is the usual default (Cormack et al.);
+# 30 favours top-ranked hits and scored best on NDCG for passage retrieval
+RRF_K_DEFAULT = 60
+RRF_K_NDCG = 30
+# Agent and chat loops often repeat a retrieval within a turn; results are reused briefly
+SEARCH_CACHE_MAX_SIZE = 512
+SEARCH_CACHE_TTL = 30  # seconds
+# Uploads of known size up to this limit go out as one multipart request with no
+# chunk buffer. Larger or unsized uploads are resumable, and without an explicit
+# chunk size the client buffers up to 100MiB per chunk; 8MiB (a multiple of the
+# required 256KiB) keeps per-upload memory bounded.
+SINGLE_SHOT_UPLOAD_LIMIT = 8 * 1024 * 1024
+RESUMABLE_CHUNK_SIZE = 8 * 1024 * 1024
+
+
+def upload_chunk_size(size: Optional[int]) -> Optional[int]:
+    """
+    Return the Blob chunk_size for an upload of the given size.
+    
+    Args:
+        size: Upload size in bytes, or None if unknown
+        
+    Returns:
+        None for a single-shot upload, otherwise RESUMABLE_CHUNK_SIZE
+    """
+    if size is not None and size <= SINGLE_SHOT_UPLOAD_LIMIT:
+        return None
+    return RESUMABLE_CHUNK_SIZE
+
+
+def to_vector_literal(embedding: Union[Sequence[float], np.ndarray]) -> str:
+    """
+    Serialize an embedding as a compact pgvector text literal.
+    
+    Values are rounded to float16 precision, which leaves cosine rankings
+    unchanged in practice and shortens each value to about five significant
+    digits, so the payload is well under half the size of a JSON float list.
+    Postgres parses the literal back into the vector column or parameter.
+    
+    Args:
+        embedding: Embedding vector; a float16 ndarray is used without conversion
+        
+    Returns:
+        Literal of the form "[v1,v2,...]"
+    """
+    return "[" + ",".join(map(str, np.asarray(embedding, dtype=np.float16))) + "]"
+
+
+class SingleQueryGoogleEmbeddings(GoogleGenerativeAIEmbeddings):
+    """
+    GoogleGenerativeAIEmbeddings whose embed_query uses the single-text endpoint.
+
+    The base class wraps the query in a list, which routes it through the batch
+    endpoint with its lower rate limits and extra latency.
+    """
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed one query string with embedContent."""
+        result = genai.embed_content(
+            model=self.model,
+            content=text,
+            task_type=self.task_type or "retrieval_query"
+        )
+        return result["embedding"]
+
 class LangChainVectorStore:
     """Vector store implementation using LangChain's Supabase integration."""
     
@@ -49,10 +148,15 @@ class LangChainVectorStore:
         self.supabase = create_client(self.supabase_url, self.supabase_key)
         
         # Initialize embeddings
-        self.embeddings = GoogleGenerativeAIEmbeddings(
+        self.embeddings = SingleQueryGoogleEmbeddings(
             model="models/embedding-001",
             google_api_key=self.gemini_api_key
         )
+        # Repeated queries (retries, re-asks, agent loops) reuse their embedding instead of
+        # calling Gemini; tuples keep the cached vectors immutable. ~1024 x 768 floats is a few MB.
+        self.embed_query: Callable[[str], Tuple[float, ...]] = lru_cache(maxsize=1024)(
+            lambda query: tuple(self.embeddings.embed_query(query))
+        )
         
         # Initialize vector store using the custom_match_documents function
         self.vector_store = SupabaseVectorStore(
@@ -61,22 +165,54 @@ class LangChainVectorStore:
             table_name=self.table_name,
             query_name="custom_match_documents"
         )
+        
+        # Optional direct Postgres pool, opened by connect_pool()
+        self._pool = None
+        # GCS bucket handle, built on first upload by _get_bucket()
+        self._bucket = None
+        # Signing can cost an IAM signBlob round-trip (ADC without a key), so URLs are
+        # signed on demand and reused within the same minute; see signed_url_for
+        self._signed_urls: Callable[[str, int, int], str] = lru_cache(maxsize=2048)(self._sign_url)
+        # Recent hybrid search results; hybrid_search runs on worker threads, hence the lock
+        self._search_cache: TTLCache = TTLCache(maxsize=SEARCH_CACHE_MAX_SIZE, ttl=SEARCH_CACHE_TTL)
+        self._search_cache_lock = threading.Lock()
     
-    def upload_to_gcp(self, buffer: bytes, filename: str, destination: str) -> str:
+    async def connect_pool(self, dsn: str, min_size: int = 5, max_size: int = 15) -> bool:
         """
-        Uploads a file buffer to GCP and returns a signed URL.
+        Open a direct asyncpg connection pool to the Supabase Postgres database.
         
         Args:
-            buffer: File content as bytes
-            filename: Name of the file
-            destination: Destination folder in GCP
+            dsn: Postgres connection string
+            min_size: Connections opened up front
+            max_size: Maximum number of pooled connections
             
         Returns:
-            Signed URL for the uploaded file
+            True if the pool was opened, False if asyncpg is not installed
+        """
+        if asyncpg is None:
+            logger.warning("asyncpg is not installed; using the Supabase REST client for writes.")
+            return False
+        # Supabase's pooler runs PgBouncer in transaction mode, which does not support prepared statement caching
+        self._pool = await asyncpg.create_pool(dsn, min_size=min_size, max_size=max_size, statement_cache_size=0)
+        return True
+    
+    async def close_pool(self) -> None:
+        """Close the asyncpg pool if one was opened."""
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+    
+    @cached_property
+    def storage_client(self) -> storage.Client:
         """
-        if not self.gcp_bucket:
-            raise ValueError("GCP_BUCKET environment variable is not set.")
+        GCS client with the configured credentials, created on first use and reused.
+        
+        Client construction loads credentials and sets up the HTTP session, so
+        every upload shares one client instead of building its own.
         
+        Returns:
+            GCS storage client
+        """
         gcp_creds = None
         if load_gcp_credentials:
             gcp_creds = load_gcp_credentials()
@@ -88,7 +224,7 @@ class LangChainVectorStore:
             # unless ADC is configured correctly without relying on GOOGLE_APPLICATION_CREDENTIALS_JSON.
             # We log a warning here if the explicit loader was available but returned None.
             if load_gcp_credentials is not None: # Check if the function itself was found
-                 print("WARNING: load_gcp_credentials() returned no credentials. Attempting default ADC for GCS client.")
+                logger.warning("load_gcp_credentials() returned no credentials. Attempting default ADC for GCS client.")
             # No explicit error raise here, to allow storage.Client() to try its default mechanisms,
             # which is what it was doing before, though it was failing.
             # This keeps the original behavior path if explicit loading fails,
@@ -102,26 +238,199 @@ class LangChainVectorStore:
             if gcp_creds:
                 project_id = gcp_creds.project_id if hasattr(gcp_creds, 'project_id') else None
                 storage_client = storage.Client(credentials=gcp_creds, project=project_id)
-                print("INFO: GCS client initialized with explicitly loaded credentials.")
+                logger.info("GCS client initialized with explicitly loaded credentials.")
             else:
                 storage_client = storage.Client() # Relies on ADC
-                print("INFO: GCS client initialized using default Application Default Credentials (ADC).")
+                logger.info("GCS client initialized using default Application Default Credentials (ADC).")
         except Exception as e:
-            print(f"ERROR: Failed to initialize GCS storage client: {e}")
+            logger.error("Failed to initialize GCS storage client: %s", e)
             # This error might occur if even the default ADC check within storage.Client() fails
             # or if there's an issue with the explicitly passed credentials.
             raise # Re-raise the exception to indicate failure to initialize client
 
-        bucket = storage_client.bucket(self.gcp_bucket)
-        full_path = f"{destination}/{filename}"
+        return storage_client
+    
+    def _get_bucket(self) -> storage.Bucket:
+        """
+        Return the target bucket handle on the shared GCS client, built once and reused.
+        
+        Returns:
+            Bucket handle for the configured GCP bucket
+        """
+        if self._bucket is None:
+            if not self.gcp_bucket:
+                raise ValueError("GCP_BUCKET environment variable is not set.")
+            self._bucket = self.storage_client.bucket(self.gcp_bucket)
+        return self._bucket
+    
+    def _sign_url(self, gs_path: str, ttl_seconds: int, minute: int) -> str:
+        """Sign a V4 download URL for a gs:// path; minute only partitions the cache."""
+        bucket_name, _, blob_name = gs_path[len("gs://"):].partition("/")
+        blob = self.storage_client.bucket(bucket_name).blob(blob_name)
+        return blob.generate_signed_url(expiration=timedelta(seconds=ttl_seconds))
+    
+    def signed_url_for(self, gs_path: str, ttl: timedelta = timedelta(minutes=15)) -> str:
+        """
+        Return a signed download URL for an uploaded file.
+        
+        URLs are cached per path for the current minute, so they stay valid for
+        at least ttl minus one minute.
+        
+        Args:
+            gs_path: gs:// path returned by an upload; anything else (e.g. a
+                signed URL stored before paths were) is returned unchanged
+            ttl: Lifetime of the signed URL
+            
+        Returns:
+            Signed URL for the file
+        """
+        if not gs_path or not gs_path.startswith("gs://"):
+            return gs_path
+        return self._signed_urls(gs_path, int(ttl.total_seconds()), int(time.time() // 60))
+    
+    def verify_gcp_access(self) -> None:
+        """
+        Verify the GCP credentials can reach the configured bucket.
+        
+        Uses a single bucket metadata lookup, so no test object is written.
+        
+        Raises:
+            RuntimeError: If the bucket does not exist or is not visible to the credentials
+        """
+        bucket = self._get_bucket()
+        if bucket.client.lookup_bucket(self.gcp_bucket) is None:
+            raise RuntimeError(f"GCP bucket '{self.gcp_bucket}' not found or not accessible")
+    
+    def upload_to_gcp(self, buffer: bytes, filename: str, destination: str) -> str:
+        """
+        Uploads a file buffer to GCP and returns its gs:// path.
+        
+        The blob is named by content, so uploading the same bytes again reuses
+        the existing blob instead of sending them.
+        
+        Args:
+            buffer: File content as bytes
+            filename: Name of the file
+            destination: Destination folder in GCP
+            
+        Returns:
+            gs:// path of the uploaded file; see signed_url_for
+        """
+        # BytesIO shares the bytes object's memory, so the client reads from the buffer without copying it
+        return self.upload_to_gcp_stream(
+            io.BytesIO(buffer), filename, destination, size=len(buffer), content_hash=content_digest(buffer)
+        )
+    
+    def upload_to_gcp_stream(
+        self,
+        file_obj: BinaryIO,
+        filename: str,
+        destination: str,
+        size: Optional[int] = None,
+        content_hash: Optional[str] = None
+    ) -> str:
+        """
+        Uploads an open binary file to GCP without reading it into memory first.
+        
+        Args:
+            file_obj: File object opened in binary mode, positioned at the start
+            filename: Name of the file
+            destination: Destination folder in GCP
+            size: Number of bytes to upload; taken from the file descriptor if omitted
+            content_hash: Optional content_digest of the stream; when given the blob
+                is named by it and an existing blob with that name is reused
+            
+        Returns:
+            gs:// path of the uploaded file; see signed_url_for
+        """
+        bucket = self._get_bucket()
+        full_path = f"{destination}/{content_hash}-{filename}" if content_hash else f"{destination}/{filename}"
+        
+        # Without a size the client always falls back to a resumable upload
+        if size is None:
+            try:
+                size = os.fstat(file_obj.fileno()).st_size - file_obj.tell()
+            except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+                size = None
+        blob = bucket.blob(full_path, chunk_size=upload_chunk_size(size))
+        if content_hash is None:
+            blob.upload_from_file(file_obj, content_type='application/pdf', size=size)
+        else:
+            try:
+                blob.upload_from_file(file_obj, content_type='application/pdf', size=size, if_generation_match=0)
+            except PreconditionFailed:
+                logger.info("%s already exists; reusing it.", full_path)
+        
+        return f"gs://{bucket.name}/{full_path}"
+    
+    def upload_file_to_gcp(
+        self,
+        file_path: str,
+        filename: str,
+        destination: str,
+        content_hash: Optional[str] = None
+    ) -> str:
+        """
+        Uploads a local file to GCP and returns its gs:// path.
+        
+        Files larger than PARALLEL_UPLOAD_THRESHOLD are sent as a multipart
+        upload with several parts in flight; smaller files use a single request.
+        Either way the file is streamed from disk and verified with CRC32C.
+        The blob is named by content, so an identical file uploaded before
+        (e.g. on a retry) is reused without sending it again.
+        
+        Args:
+            file_path: Path of the local file to upload
+            filename: Name of the file
+            destination: Destination folder in GCP
+            content_hash: content_digest of the file if the caller already has it;
+                computed here otherwise
+            
+        Returns:
+            gs:// path of the uploaded file; see signed_url_for
+        """
+        bucket = self._get_bucket()
+        full_path = f"{destination}/{content_hash or content_digest(file_path)}-{filename}"
         
-        # Upload file
         blob = bucket.blob(full_path)
-        blob.upload_from_string(buffer, content_type='application/pdf')
+        try:
+            self._upload_file_if_absent(blob, file_path)
+        except PreconditionFailed:
+            logger.info("%s already exists; reusing it.", full_path)
         
-        # Generate signed URL
-        url = blob.generate_signed_url(expiration=timedelta(minutes=15))
-        return url
+        return f"gs://{bucket.name}/{full_path}"
+    
+    def _upload_file_if_absent(self, blob: storage.Blob, file_path: str) -> None:
+        """
+        Upload a local file to a blob unless the blob already exists.
+        
+        Raises:
+            PreconditionFailed: If the blob already exists
+        """
+        if os.path.getsize(file_path) > PARALLEL_UPLOAD_THRESHOLD:
+            # The multipart upload takes no generation precondition, so check first
+            if blob.exists():
+                raise PreconditionFailed(f"{blob.name} already exists")
+            # Threads rather than processes: this already runs off the event loop
+            # and the blob/client would otherwise have to be pickled per worker
+            transfer_manager.upload_chunks_concurrently(
+                file_path,
+                blob,
+                content_type='application/pdf',
+                chunk_size=PARALLEL_UPLOAD_CHUNK_SIZE,
+                max_workers=PARALLEL_UPLOAD_WORKERS,
+                worker_type=transfer_manager.THREAD,
+                checksum="crc32c",
+                timeout=GCP_UPLOAD_TIMEOUT
+            )
+        else:
+            blob.upload_from_filename(
+                file_path,
+                content_type='application/pdf',
+                checksum="crc32c",
+                timeout=GCP_UPLOAD_TIMEOUT,
+                if_generation_match=0
+            )
     
     def insert_file_metadata(self, title: str, link: str) -> str:
         """
@@ -134,9 +443,8 @@ class LangChainVectorStore:
         Returns:
             File ID
         """
-        file_id = uuid.uuid4().hex
+        # The id column defaults to gen_random_uuid() (migrations/004_files_id_default.sql)
         file_metadata = {
-            "id": file_id,
             "title": title,
             "link": link,
             "license": "unknown",
@@ -148,13 +456,31 @@ class LangChainVectorStore:
         if not response.data:
             raise Exception("Failed to insert file metadata into Supabase")
         
-        # Get file ID from response
-        inserted_file_record = response.data[0]
-        file_id_from_db = inserted_file_record.get("id")
-        if file_id_from_db:
-            file_id = file_id_from_db
+        return str(response.data[0]["id"])
+    
+    async def ainsert_file_metadata(self, title: str, link: str) -> str:
+        """
+        Async variant of insert_file_metadata, using the asyncpg pool when available.
+        
+        Args:
+            title: File title
+            link: File URL
+            
+        Returns:
+            File ID
+        """
+        if self._pool is None:
+            return await asyncio.to_thread(self.insert_file_metadata, title=title, link=link)
         
-        return file_id
+        async with self._pool.acquire() as conn:
+            file_id = await conn.fetchval(
+                "INSERT INTO files (title, link, license, in_database) "
+                "VALUES ($1, $2, $3, $4) RETURNING id",
+                title, link, "unknown", True
+            )
+        if not file_id:
+            raise Exception("Failed to insert file metadata into Supabase")
+        return str(file_id)
     
     def add_documents(
         self,
@@ -179,32 +505,38 @@ class LangChainVectorStore:
 
         if embeddings_list is not None:
             if len(documents) != len(embeddings_list):
-                print("ERROR: Mismatch between number of documents and provided embeddings_list.")
+                logger.error("Mismatch between number of documents and provided embeddings_list.")
                 raise ValueError("Mismatch between documents and provided embeddings count.")
             document_embeddings = embeddings_list
-            print(f"Using {len(document_embeddings)} pre-computed embeddings in add_documents.")
+            logger.info("Using %s pre-computed embeddings in add_documents.", len(document_embeddings))
         else:
             document_contents = [doc.page_content for doc in documents]
             if not document_contents:
-                print("No document contents to process in add_documents for embedding generation.")
+                logger.info("No document contents to process in add_documents for embedding generation.")
                 return []
             try:
-                document_embeddings = self.embeddings.embed_documents(document_contents)
-                print(f"Successfully generated {len(document_embeddings)} embeddings in add_documents.")
+                # One request per batch, each within Gemini's item and payload limits
+                document_embeddings = [
+                    embedding
+                    for batch in pack_batches(document_contents)
+                    for embedding in self.embeddings.embed_documents(batch)
+                ]
+                logger.info("Successfully generated %s embeddings in add_documents.", len(document_embeddings))
             except Exception as e_embed:
-                print(f"ERROR generating embeddings in add_documents: {e_embed}")
+                logger.error("Error generating embeddings in add_documents: %s", e_embed)
                 raise
 
         if len(documents) != len(document_embeddings):
             # This check is a bit redundant if embeddings_list path is taken, but good for safety
-            print("ERROR: Mismatch between number of documents and final embeddings count.")
+            logger.error("Mismatch between number of documents and final embeddings count.")
             raise ValueError("Mismatch between documents and final embeddings count.")
 
-        print(f"Attempting to insert {len(documents)} chunks into Supabase table '{self.table_name}'...")
+        logger.info("Attempting to insert %s chunks into Supabase table '%s'...", len(documents), self.table_name)
+        rows = []
         for i, (doc, embedding_vector) in enumerate(zip(documents, document_embeddings)):
             # Ensure required metadata keys are present
             if not all(k in doc.metadata for k in ["fileId", "position", "originalName", "downloadUrl"]):
-                print(f"ERROR: Missing required metadata for document at index {i}. Metadata: {doc.metadata}")
+                logger.error("Missing required metadata for document at index %s. Metadata: %s", i, doc.metadata)
                 # Skip this document or raise an error
                 # For now, skipping to avoid partial failure of the batch without explicit error.
                 # Consider raising an error if all documents must succeed.
@@ -212,32 +544,108 @@ class LangChainVectorStore:
 
             chunk_uuid = doc.metadata.get("id", str(uuid.uuid4())) # Use provided ID or generate new
             
-            chunk_data_to_insert = {
+            rows.append({
                 "id": chunk_uuid,
                 "fileId": doc.metadata["fileId"],
                 "position": doc.metadata["position"],
                 "originalName": doc.metadata["originalName"],
                 "content": doc.page_content,  # Text content of the chunk
                 "downloadUrl": doc.metadata["downloadUrl"],
-                "embedding": embedding_vector # The generated embedding
+                "embedding": to_vector_literal(embedding_vector) # The generated embedding
                 # 'fts' (full-text search) and 'created_at' columns are expected 
                 # to be handled by Supabase (e.g., via triggers or default values).
-            }
-            try:
-                self.supabase.table(self.table_name).insert(chunk_data_to_insert).execute()
-                inserted_chunk_ids.append(chunk_uuid)
-            except Exception as e_insert_chunk:
-                print(f"ERROR inserting chunk {i} (ID: {chunk_uuid}, FileID: {doc.metadata.get('fileId')}): {e_insert_chunk}")
-                # Decide on error handling: continue, or re-raise to stop all processing?
-                # For now, re-raising to indicate failure of the overall add_documents call.
-                raise Exception(f"Failed to insert chunk {i} (ID: {chunk_uuid}). Original error: {e_insert_chunk}") 
-            
-            if (i + 1) % 20 == 0 or (i + 1) == len(documents):
-                    print(f"   ...stored chunk {i + 1}/{len(documents)} in add_documents.")
+            })
+            inserted_chunk_ids.append(chunk_uuid)
+        
+        if rows:
+            self.bulk_insert_chunks(rows)
         
-        print(f"Successfully inserted {len(inserted_chunk_ids)} chunks into '{self.table_name}'.")
+        logger.info("Successfully inserted %s chunks into '%s'.", len(inserted_chunk_ids), self.table_name)
         return inserted_chunk_ids
     
+    def add_documents_concurrent(
+        self,
+        documents: List[Document],
+        batch_size: int = 100,
+        max_inflight: int = 5
+    ) -> List[str]:
+        """
+        Embed documents with several batch requests in flight, then insert them in one call.
+        
+        Args:
+            documents: List of LangChain Document objects, each with populated .metadata
+            batch_size: Maximum number of texts sent per embedding request
+            max_inflight: Maximum number of embedding requests in flight
+            
+        Returns:
+            List of UUIDs of the inserted chunks
+        """
+        texts = [doc.page_content for doc in documents]
+        batches = list(pack_batches(texts, max_items=batch_size))
+        
+        def embed_batch(batch: List[str]) -> List[List[float]]:
+            # Stagger the first requests so they don't hit the API as one burst
+            time.sleep(random.uniform(0, 0.1))
+            return self.embeddings.embed_documents(batch)
+        
+        with ThreadPoolExecutor(max_workers=max_inflight) as executor:
+            # map() yields results in batch order, so embeddings stay parallel to documents
+            embeddings = [embedding for batch_embeddings in executor.map(embed_batch, batches) for embedding in batch_embeddings]
+        logger.info("Generated %s embeddings in %s concurrent batches.", len(embeddings), len(batches))
+        
+        return self.add_documents(documents, embeddings_list=embeddings)
+    
+    def bulk_insert_chunks(self, rows: List[Dict[str, Any]]) -> None:
+        """
+        Insert chunk rows via the bulk_insert_chunks RPC, one round-trip per BULK_INSERT_MAX_ROWS rows.
+        
+        The Postgres function is defined in migrations/001_bulk_insert_chunks.sql.
+        
+        Args:
+            rows: Chunk rows keyed by column name (id, fileId, position,
+                originalName, content, downloadUrl, embedding)
+        """
+        for start in range(0, len(rows), BULK_INSERT_MAX_ROWS):
+            batch = rows[start:start + BULK_INSERT_MAX_ROWS]
+            try:
+                self.supabase.rpc("bulk_insert_chunks", {"rows": batch}).execute()
+            except Exception as e_insert:
+                logger.error("Error inserting %s chunks starting at index %s via bulk_insert_chunks: %s", len(batch), start, e_insert)
+                raise Exception(f"Failed to insert chunks starting at index {start}. Original error: {e_insert}")
+    
+    def insert_document_with_chunks(self, file_metadata: Dict[str, Any], rows: List[Dict[str, Any]]) -> str:
+        """
+        Insert a file's metadata and all of its chunks in one RPC and one transaction.
+        
+        The Postgres function is defined in migrations/002_insert_document_with_chunks.sql.
+        Either the file and every chunk are inserted or nothing is, so a failed
+        ingest leaves no orphaned file row behind.
+        
+        Args:
+            file_metadata: files row keyed by column name (title, link, license, in_database)
+            rows: Chunk rows as for bulk_insert_chunks; their fileId is set server-side
+            
+        Returns:
+            ID of the inserted file
+        """
+        try:
+            response = self.supabase.rpc("insert_document_with_chunks", {
+                "file_meta": file_metadata,
+                "chunks": rows
+            }).execute()
+        except Exception as e_insert:
+            logger.error("Error inserting file '%s' with %s chunks: %s", file_metadata.get("title"), len(rows), e_insert)
+            raise Exception(f"Failed to insert file metadata and {len(rows)} chunks. Original error: {e_insert}")
+        # The function returns a scalar, but PostgREST may wrap it in a row or a list of rows
+        file_id = response.data
+        if isinstance(file_id, list):
+            file_id = file_id[0] if file_id else None
+        if isinstance(file_id, dict):
+            file_id = file_id.get("insert_document_with_chunks", file_id.get("id"))
+        if not file_id:
+            raise Exception("Failed to insert file metadata into Supabase or no data returned.")
+        return str(file_id)
+    
     def add_documents_batch(
         self,
         documents: List[Document],
@@ -261,17 +669,17 @@ class LangChainVectorStore:
         # Validate and get embeddings
         if embeddings_list is not None:
             if len(documents) != len(embeddings_list):
-                print("ERROR: Mismatch between number of documents and provided embeddings_list.")
+                logger.error("Mismatch between number of documents and provided embeddings_list.")
                 raise ValueError("Mismatch between documents and provided embeddings count.")
             document_embeddings = embeddings_list
-            print(f"Using {len(document_embeddings)} pre-computed embeddings in add_documents_batch.")
+            logger.info("Using %s pre-computed embeddings in add_documents_batch.", len(document_embeddings))
         else:
             document_contents = [doc.page_content for doc in documents]
             if not document_contents:
-                print("No document contents to process in add_documents_batch for embedding generation.")
+                logger.info("No document contents to process in add_documents_batch for embedding generation.")
                 return []
             try:
-                print("Generating embeddings...")
+                logger.info("Generating embeddings...")
                 # Process embeddings in batches of 20 to show progress
                 embedding_batch_size = 20
                 document_embeddings = []
@@ -279,22 +687,22 @@ class LangChainVectorStore:
                     batch = document_contents[i:i + embedding_batch_size]
                     batch_embeddings = self.embeddings.embed_documents(batch)
                     document_embeddings.extend(batch_embeddings)
-                print(f"Successfully generated {len(document_embeddings)} embeddings.")
+                logger.info("Successfully generated %s embeddings.", len(document_embeddings))
             except Exception as e_embed:
-                print(f"ERROR generating embeddings in add_documents_batch: {e_embed}")
+                logger.error("Error generating embeddings in add_documents_batch: %s", e_embed)
                 raise
 
         if len(documents) != len(document_embeddings):
-            print("ERROR: Mismatch between number of documents and final embeddings count.")
+            logger.error("Mismatch between number of documents and final embeddings count.")
             raise ValueError("Mismatch between documents and final embeddings count.")
 
         # Prepare all chunks data first
-        print("Preparing chunks data...")
+        logger.info("Preparing chunks data...")
         chunks_data = []
         for i, (doc, embedding_vector) in enumerate(tqdm(zip(documents, document_embeddings), total=len(documents), desc="Preparing chunks")):
             # Ensure required metadata keys are present
             if not all(k in doc.metadata for k in ["fileId", "position", "originalName", "downloadUrl"]):
-                print(f"ERROR: Missing required metadata for document at index {i}. Metadata: {doc.metadata}")
+                logger.error("Missing required metadata for document at index %s. Metadata: %s", i, doc.metadata)
                 continue
 
             chunk_uuid = doc.metadata.get("id", str(uuid.uuid4()))
@@ -305,23 +713,91 @@ class LangChainVectorStore:
                 "originalName": doc.metadata["originalName"],
                 "content": doc.page_content,
                 "downloadUrl": doc.metadata["downloadUrl"],
-                "embedding": embedding_vector
+                "embedding": to_vector_literal(embedding_vector)
             })
             inserted_chunk_ids.append(chunk_uuid)
 
         # Insert in batches
         total_batches = (len(chunks_data) + batch_size - 1) // batch_size
-        print(f"Inserting {len(chunks_data)} chunks in {total_batches} batches (size: {batch_size})...")
+        logger.info("Inserting %s chunks in %s batches (size: %s)...", len(chunks_data), total_batches, batch_size)
         
         for i in tqdm(range(0, len(chunks_data), batch_size), desc="Inserting chunks", total=total_batches):
             batch = chunks_data[i:i + batch_size]
             try:
                 self.supabase.table(self.table_name).insert(batch).execute()
             except Exception as e_insert_batch:
-                print(f"ERROR inserting batch starting at index {i}: {e_insert_batch}")
+                logger.error("Error inserting batch starting at index %s: %s", i, e_insert_batch)
                 raise Exception(f"Failed to insert batch starting at index {i}. Original error: {e_insert_batch}")
 
-        print(f"Successfully inserted {len(inserted_chunk_ids)} chunks using batch insertion.")
+        logger.info("Successfully inserted %s chunks using batch insertion.", len(inserted_chunk_ids))
+        return inserted_chunk_ids
+    
+    async def add_documents_async(
+        self,
+        documents: List[Document],
+        embeddings_list: List[List[float]],
+        batch_size: int = 200,
+        max_concurrency: int = 4
+    ) -> List[str]:
+        """
+        Add documents to Supabase in batches, running several batch inserts concurrently.
+        
+        Args:
+            documents: List of LangChain Document objects, each with populated .metadata
+            embeddings_list: List of embedding vectors, parallel to documents
+            batch_size: Number of records to insert in each batch (default: 200)
+            max_concurrency: Maximum number of batch inserts in flight
+            
+        Returns:
+            List of UUIDs of the inserted chunks
+        """
+        if len(documents) != len(embeddings_list):
+            raise ValueError("Mismatch between documents and provided embeddings count.")
+        
+        semaphore = asyncio.Semaphore(max_concurrency)
+        insert_sql = (
+            f'INSERT INTO "{self.table_name}" (id, "fileId", position, "originalName", content, "downloadUrl", embedding) '
+            "VALUES ($1, $2, $3, $4, $5, $6, $7::vector)"
+        )
+        
+        async def insert_batch(start: int) -> List[str]:
+            rows = []
+            for i in range(start, min(start + batch_size, len(documents))):
+                doc = documents[i]
+                if not all(k in doc.metadata for k in ["fileId", "position", "originalName", "downloadUrl"]):
+                    logger.error("Missing required metadata for document at index %s. Metadata: %s", i, doc.metadata)
+                    continue
+                rows.append({
+                    "id": doc.metadata.get("id", str(uuid.uuid4())),
+                    "fileId": doc.metadata["fileId"],
+                    "position": doc.metadata["position"],
+                    "originalName": doc.metadata["originalName"],
+                    "content": doc.page_content,
+                    "downloadUrl": doc.metadata["downloadUrl"],
+                    "embedding": to_vector_literal(embeddings_list[i])
+                })
+            if not rows:
+                return []
+            
+            async with semaphore:
+                try:
+                    if self._pool is not None:
+                        async with self._pool.acquire() as conn:
+                            await conn.executemany(insert_sql, [
+                                (row["id"], row["fileId"], row["position"], row["originalName"],
+                                 row["content"], row["downloadUrl"], row["embedding"])
+                                for row in rows
+                            ])
+                    else:
+                        # The Supabase client is synchronous, so each insert runs in a worker thread
+                        await asyncio.to_thread(self.supabase.table(self.table_name).insert(rows).execute)
+                except Exception as e_insert_batch:
+                    raise Exception(f"Failed to insert batch starting at index {start}. Original error: {e_insert_batch}")
+            return [row["id"] for row in rows]
+        
+        results = await asyncio.gather(*(insert_batch(i) for i in range(0, len(documents), batch_size)))
+        inserted_chunk_ids = [chunk_id for batch_ids in results for chunk_id in batch_ids]
+        logger.info("Successfully inserted %s chunks using concurrent batch insertion.", len(inserted_chunk_ids))
         return inserted_chunk_ids
     
     def similarity_search(
@@ -343,51 +819,198 @@ class LangChainVectorStore:
         """
         return self.vector_store.similarity_search(query, k=k, filter=filter)
     
+    @staticmethod
+    def _search_cache_key(
+        query: str,
+        query_embedding: Optional[Union[Sequence[float], np.ndarray]],
+        *args: Any
+    ) -> tuple:
+        """Key hybrid search results by all their arguments; a caller-supplied embedding by the digest of its float32 bytes."""
+        embedding_key = None
+        if query_embedding is not None:
+            embedding_key = content_digest(np.asarray(query_embedding, dtype=np.float32).tobytes())
+        return (query, embedding_key, *args)
+    
+    def _cache_search_results(self, key: tuple, results: List[Dict[str, Any]]) -> None:
+        """Remember hybrid search results; empty results are not cached so callers polling for new chunks see them."""
+        if results:
+            with self._search_cache_lock:
+                self._search_cache[key] = list(results)
+    
+    def clear_search_cache(self) -> None:
+        """Drop cached hybrid search results, e.g. after new chunks are inserted."""
+        with self._search_cache_lock:
+            self._search_cache.clear()
+    
     def hybrid_search(
         self,
         query: str,
-        query_embedding: List[float],
+        query_embedding: Optional[Union[Sequence[float], np.ndarray]] = None,
         match_count: int = 10,
         full_text_weight: float = 1.0,
         semantic_weight: float = 1.0,
-        rrf_k: int = 50,
-        file_title: str = ""
+        rrf_k: int = RRF_K_DEFAULT,
+        file_title: str = "",
+        file_id: Optional[str] = None
     ) -> List[Dict[str, Any]]:
         """
         Perform hybrid search using Supabase's RPC function.
         
         Args:
             query: Search query
-            query_embedding: Query embedding vector
+            query_embedding: Query embedding as a list, tuple or ndarray; computed (and cached) from query if None.
+                Results are cached for SEARCH_CACHE_TTL seconds by query, embedding and the other arguments
             match_count: Number of results to return
             full_text_weight: Weight for full-text search
             semantic_weight: Weight for semantic search
-            rrf_k: RRF parameter
+            rrf_k: RRF parameter; RRF_K_NDCG suits callers tuned for NDCG
             file_title: Optional file title filter
+            file_id: Optional file ID filter; uses the index on chunks.fileId, so
+                prefer it over file_title when the ID is known
             
         Returns:
             List of search results
         """
+        key = self._search_cache_key(
+            query, query_embedding, match_count, full_text_weight, semantic_weight, rrf_k, file_title, file_id
+        )
+        with self._search_cache_lock:
+            cached = self._search_cache.get(key)
+        if cached is not None:
+            return list(cached)
+        
+        if query_embedding is None:
+            query_embedding = self.embed_query(query)
         try:
             response = self.supabase.rpc("hybrid_search", {
                 "query_text": query,
-                "query_embedding": query_embedding,
+                "query_embedding": to_vector_literal(query_embedding),
                 "match_count": match_count,
                 "full_text_weight": full_text_weight,
                 "semantic_weight": semantic_weight,
                 "rrf_k": rrf_k,
-                "file_title": file_title
+                "file_title": file_title,
+                "file_id": file_id
             }).execute()
             
             if response.data is None:
-                print("Supabase RPC returned no data.")
+                logger.debug("Supabase RPC returned no data.")
                 return []
             
-            print(f"Supabase RPC returned {len(response.data)} results.")
+            logger.debug("Supabase RPC returned %s results.", len(response.data))
+            self._cache_search_results(key, response.data)
             return response.data
             
         except Exception as e:
-            print(f"Error during Supabase hybrid search: {e}")
+            logger.error("Error during Supabase hybrid search: %s", e)
             if hasattr(e, 'message'):
-                print(f"Supabase Error Message: {e.message}")
-            raise 
\ No newline at end of file
+                logger.error("Supabase Error Message: %s", e.message)
+            raise
+    
+    def mmr_search(
+        self,
+        query: str,
+        k: int = 10,
+        fetch_k: int = 30,
+        lambda_mult: float = 0.5,
+        query_embedding: Optional[Union[Sequence[float], np.ndarray]] = None,
+        file_title: str = "",
+        file_id: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Hybrid search re-ranked with maximal marginal relevance for diverse results.
+        
+        Over-fetches fetch_k candidates in one hybrid_search call, loads their
+        stored embeddings in one select and keeps the k that best balance
+        relevance to the query against similarity to the chunks already picked.
+        Cheaper than raising match_count for the same diversity. hybrid_search
+        returns at most 30 rows, which caps fetch_k.
+        
+        Args:
+            query: Search query
+            k: Number of results to return
+            fetch_k: Number of hybrid search candidates to re-rank
+            lambda_mult: 1 ranks purely by relevance, 0 purely by diversity
+            query_embedding: Optional precomputed query embedding
+            file_title: Optional file title filter
+            file_id: Optional file ID filter
+            
+        Returns:
+            Up to k search results, most relevant first
+        """
+        if query_embedding is None:
+            query_embedding = self.embed_query(query)
+        candidates = self.hybrid_search(
+            query=query,
+            query_embedding=query_embedding,
+            match_count=fetch_k,
+            file_title=file_title,
+            file_id=file_id
+        )
+        if len(candidates) <= k:
+            return candidates
+        
+        response = self.supabase.table(self.table_name).select("id, embedding").in_(
+            "id", [candidate["id"] for candidate in candidates]
+        ).execute()
+        # pgvector returns vectors as "[v1,v2,...]" text, which is valid JSON
+        embeddings = {
+            row["id"]: json.loads(row["embedding"]) if isinstance(row["embedding"], str) else row["embedding"]
+            for row in response.data or []
+        }
+        candidates = [candidate for candidate in candidates if candidate["id"] in embeddings]
+        selected = maximal_marginal_relevance(
+            np.asarray(query_embedding, dtype=np.float32),
+            [embeddings[candidate["id"]] for candidate in candidates],
+            lambda_mult=lambda_mult,
+            k=k
+        )
+        return [candidates[i] for i in selected]
+    
+    async def ahybrid_search(
+        self,
+        query: str,
+        query_embedding: Optional[Union[Sequence[float], np.ndarray]] = None,
+        match_count: int = 10,
+        full_text_weight: float = 1.0,
+        semantic_weight: float = 1.0,
+        rrf_k: int = RRF_K_DEFAULT,
+        file_title: str = "",
+        file_id: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Async variant of hybrid_search that calls the SQL function over the asyncpg pool.
+        
+        Skips the PostgREST HTTP hop and JSON round-trip; without a pool it runs
+        hybrid_search in a worker thread. Arguments are as for hybrid_search.
+        
+        Returns:
+            List of search results
+        """
+        if self._pool is None:
+            return await asyncio.to_thread(
+                self.hybrid_search, query, query_embedding, match_count,
+                full_text_weight, semantic_weight, rrf_k, file_title, file_id
+            )
+        
+        key = self._search_cache_key(
+            query, query_embedding, match_count, full_text_weight, semantic_weight, rrf_k, file_title, file_id
+        )
+        with self._search_cache_lock:
+            cached = self._search_cache.get(key)
+        if cached is not None:
+            return list(cached)
+        
+        if query_embedding is None:
+            query_embedding = await asyncio.to_thread(self.embed_query, query)
+        # The pool has no statement cache (PgBouncer transaction mode), so this is sent unprepared
+        rows = await self._pool.fetch(
+            "SELECT * FROM hybrid_search(query_text => $1, query_embedding => $2::vector, match_count => $3, "
+            "full_text_weight => $4, semantic_weight => $5, rrf_k => $6, file_title => $7, file_id => $8)",
+            query, to_vector_literal(query_embedding), match_count,
+            full_text_weight, semantic_weight, rrf_k, file_title, file_id
+        )
+        logger.debug("hybrid_search returned %s results.", len(rows))
+        results = [dict(row) for row in rows]
+        self._cache_search_results(key, results)
+        return results
@@ -1,38 +1,149 @@
 import os # Added for debugging.
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from src.core.app_settings import settings
 from src.api.routes import api_router
+from src.api.routes.document_upload import reap_expired_uploads
 # from src.infrastructure.vector_store.langchain_vector_store import LangChainVectorStore  # Old import
 from src.infrastructure.vector_store.supabase_store import LangChainVectorStore  # Changed
+from src.infrastructure.document_processing.pdf_processor import LangChainDocumentProcessor, init_pdf_worker
+from src.infrastructure.rag.query_processor import LangChainRAGChain
+from src.infrastructure.cache.response_cache import ExactResponseCache
+from src.infrastructure.cache.semantic_cache import SemanticCache
+from src.infrastructure.cache.processed_document_cache import ProcessedDocumentCache
+from src.infrastructure.uploads.session_store import RedisUploadSessionStore, UploadSessionStore
+import asyncio
 import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
+# Set up logging: handlers only enqueue records, and a background thread writes them
+# to stderr, so request handlers never block on the stream
+_log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(-1)
+_log_listener = QueueListener(_log_queue, logging.StreamHandler(), respect_handler_level=True)
+logging.basicConfig(level=settings.LOG_LEVEL, handlers=[QueueHandler(_log_queue)])
+_log_listener.start()
 logger = logging.getLogger(__name__)
 
 # --- TEMPORARY DEBUGGING ---
-print(f"DEBUG: GOOGLE_APPLICATION_CREDENTIALS as seen by main.py: {os.getenv('GOOGLE_APPLICATION_CREDENTIALS')}")
+logger.debug("GOOGLE_APPLICATION_CREDENTIALS as seen by main.py: %s", os.getenv('GOOGLE_APPLICATION_CREDENTIALS'))
 # --- END TEMPORARY DEBUGGING ---
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Build the shared pipeline components once per worker and expose them on app.state.
+    
+    Routes read them through the getters in src.api.dependencies, so every route
+    shares one Supabase client, one embeddings client and one set of caches.
+    """
+    try:
+        logger.info("Initializing document processor with chunk_size=%d", settings.CHUNK_SIZE)
+        app.state.document_processor = LangChainDocumentProcessor(
+            chunk_size=settings.CHUNK_SIZE,
+            gemini_api_key=settings.GEMINI_API_KEY,
+            chunking=settings.CHUNKING_STRATEGY
+        )
+        
+        logger.info("Initializing vector store with Supabase URL=%s, table=%s",
+                    settings.SUPABASE_URL, settings.SUPABASE_TABLE)
+        app.state.vector_store = LangChainVectorStore(
+            supabase_url=settings.SUPABASE_URL,
+            supabase_key=settings.SUPABASE_KEY,
+            gemini_api_key=settings.GEMINI_API_KEY,
+            table_name=settings.SUPABASE_TABLE
+        )
+        
+        if settings.SUPABASE_DB_URL:
+            logger.info("Opening Postgres connection pool (max_size=%d)", settings.DB_POOL_MAX_SIZE)
+            await app.state.vector_store.connect_pool(
+                settings.SUPABASE_DB_URL,
+                min_size=settings.DB_POOL_MIN_SIZE,
+                max_size=settings.DB_POOL_MAX_SIZE
+            )
+        
+        if settings.VERIFY_GCP_ON_STARTUP:
+            # Opt-in: one bucket lookup per worker, logged rather than fatal
+            try:
+                await asyncio.to_thread(app.state.vector_store.verify_gcp_access)
+                logger.info("GCP credentials verified")
+            except Exception as e:
+                logger.warning("GCP credentials verification failed: %s", e)
+        
+        logger.info("Initializing RAG chain with model: %s", settings.GENERATION_MODEL)
+        app.state.rag_chain = LangChainRAGChain(
+            vector_store=app.state.vector_store,
+            gemini_api_key=settings.GEMINI_API_KEY,
+            model_name=settings.GENERATION_MODEL
+        )
+        
+        # PDF parsing and OCR are CPU-bound; run them in worker processes to keep the event loop free
+        logger.info("Starting PDF worker pool with %d processes", settings.PDF_WORKERS)
+        app.state.pdf_pool = ProcessPoolExecutor(
+            max_workers=settings.PDF_WORKERS,
+            initializer=init_pdf_worker,
+            initargs=(settings.CHUNK_SIZE, settings.CHUNK_OVERLAP, settings.GEMINI_API_KEY, settings.CHUNKING_STRATEGY)
+        )
+    except Exception as e:
+        logger.exception("Failed to initialize application components: %s", e)
+        raise
+    
+    # Exact-match cache of recent answers, checked before the semantic cache
+    app.state.response_cache = ExactResponseCache(
+        max_size=settings.EXACT_CACHE_MAX_SIZE,
+        ttl=settings.EXACT_CACHE_TTL
+    )
+    # Semantic cache of recent answers, scoped per file title
+    app.state.semantic_cache = SemanticCache(
+        threshold=settings.SEMANTIC_CACHE_THRESHOLD,
+        max_size=settings.SEMANTIC_CACHE_MAX_SIZE,
+        ann_threshold=settings.SEMANTIC_CACHE_ANN_THRESHOLD
+    )
+    # Chunks and embeddings of recently processed files, reused when the same file is uploaded again
+    app.state.processed_cache = ProcessedDocumentCache(max_size=settings.PROCESSED_DOC_CACHE_SIZE)
+    # Chunked upload sessions must be shared when several workers serve the same upload
+    if settings.REDIS_URL:
+        logger.info("Storing chunked upload sessions in Redis")
+        app.state.upload_sessions = RedisUploadSessionStore(settings.REDIS_URL)
+    else:
+        app.state.upload_sessions = UploadSessionStore()
+    logger.info("Application components initialized successfully")
+    
+    # Abandoned chunked uploads are removed in the background
+    reaper = asyncio.create_task(reap_expired_uploads(app.state.upload_sessions))
+    
+    yield
+    
+    reaper.cancel()
+    await app.state.response_cache.clear()
+    app.state.semantic_cache.clear()
+    app.state.processed_cache.clear()
+    app.state.pdf_pool.shutdown(wait=True, cancel_futures=True)
+    await app.state.vector_store.close_pool()
+    await app.state.upload_sessions.close()
+    _log_listener.stop()
+
 # Create FastAPI app
 app = FastAPI(
     title=settings.API_TITLE,
     version=settings.API_VERSION,
-    description=settings.API_DESCRIPTION
+    description=settings.API_DESCRIPTION,
+    lifespan=lifespan
 )
 
 # Add request logging middleware
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
-    logger.info(f"Request: {request.method} {request.url}")
+    logger.info("Request: %s %s", request.method, request.url)
     # Log headers selectively (to avoid logging sensitive info)
     headers_to_log = {k: v for k, v in request.headers.items() 
                      if k.lower() in ['origin', 'referer', 'user-agent', 'content-type']}
-    logger.info(f"Headers: {headers_to_log}")
+    logger.info("Headers: %s", headers_to_log)
     
     response = await call_next(request)
-    logger.info(f"Response status: {response.status_code}")
+    logger.info("Response status: %s", response.status_code)
     return response
 
 # Add CORS middleware with expanded configuration for better compatibility
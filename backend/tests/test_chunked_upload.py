@@ -0,0 +1,58 @@
+import json
+import os
+import pytest
+
+pytest.importorskip("fastapi")
+from fastapi import HTTPException
+from src.api.routes.document_upload import (
+    parse_chunk_request,
+    preallocate_file,
+    reject_oversized_chunk,
+    write_at,
+)
+
+def test_out_of_order_chunk_writes_reassemble_file(tmp_path):
+    data = os.urandom(10_000)
+    chunk_size = 4096
+    chunks = [(offset, data[offset:offset + chunk_size]) for offset in range(0, len(data), chunk_size)]
+    path = str(tmp_path / "upload.bin")
+
+    preallocate_file(path, len(data))
+    assert os.path.getsize(path) == len(data)
+    for offset, chunk in reversed(chunks):
+        write_at(path, chunk, offset)
+    # A retried chunk overwrites the same range
+    write_at(path, bytearray(chunks[1][1]), chunks[1][0])
+
+    with open(path, "rb") as f:
+        assert f.read() == data
+
+def test_preallocate_empty_file(tmp_path):
+    path = str(tmp_path / "empty.bin")
+    preallocate_file(path, 0)
+    assert os.path.getsize(path) == 0
+
+def test_oversized_chunk_is_rejected_with_413():
+    session = {"request_id": "test"}
+    reject_oversized_chunk(session, 0, size=1024, max_size=1024)
+
+    with pytest.raises(HTTPException) as exc_info:
+        reject_oversized_chunk(session, 3, size=1025, max_size=1024)
+    assert exc_info.value.status_code == 413
+
+def test_parse_chunk_request():
+    body = json.dumps({"upload_id": "u1", "chunk_index": 2, "total_chunks": 5, "chunk_data": "AAEC"}).encode()
+    request = parse_chunk_request(body)
+    assert (request.upload_id, request.chunk_index, request.total_chunks, request.chunk_data) == ("u1", 2, 5, "AAEC")
+
+@pytest.mark.parametrize("body", [
+    b"not json",
+    b"[1, 2]",
+    json.dumps({"upload_id": "u1", "chunk_index": 2, "total_chunks": 5}).encode(),
+    json.dumps({"upload_id": "u1", "chunk_index": "2", "total_chunks": 5, "chunk_data": "AAEC"}).encode(),
+    json.dumps({"upload_id": "u1", "chunk_index": True, "total_chunks": 5, "chunk_data": "AAEC"}).encode(),
+])
+def test_parse_chunk_request_rejects_malformed_bodies(body):
+    with pytest.raises(HTTPException) as exc_info:
+        parse_chunk_request(body)
+    assert exc_info.value.status_code == 422
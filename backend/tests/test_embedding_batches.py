@@ -0,0 +1,37 @@
+from backend.src.infrastructure.document_processing.embedding_batches import (
+    MAX_BATCH_BYTES,
+    MAX_BATCH_ITEMS,
+    pack_batches,
+)
+
+def test_batches_split_at_item_limit():
+    texts = [f"text {i}" for i in range(2 * MAX_BATCH_ITEMS + 1)]
+    batches = list(pack_batches(texts))
+
+    assert [len(batch) for batch in batches] == [MAX_BATCH_ITEMS, MAX_BATCH_ITEMS, 1]
+    assert [text for batch in batches for text in batch] == texts
+
+def test_batches_split_at_byte_limit():
+    # Three texts fit in the byte limit, a fourth does not
+    size = MAX_BATCH_BYTES // 3
+    texts = ["a" * size] * 4
+    batches = list(pack_batches(texts))
+
+    assert [len(batch) for batch in batches] == [3, 1]
+    assert all(sum(len(text) for text in batch) <= MAX_BATCH_BYTES for batch in batches)
+
+def test_batch_exactly_at_byte_limit_is_not_split():
+    texts = ["a" * (MAX_BATCH_BYTES - 10), "b" * 10]
+    assert list(pack_batches(texts)) == [texts]
+
+def test_bytes_are_counted_as_utf8():
+    # "é" is two bytes in UTF-8, so 6 of them exceed a 10 byte limit
+    batches = list(pack_batches(["é"] * 6, max_bytes=10))
+    assert [len(batch) for batch in batches] == [5, 1]
+
+def test_oversized_text_gets_a_batch_of_its_own():
+    texts = ["small", "x" * (MAX_BATCH_BYTES + 1), "small again"]
+    assert list(pack_batches(texts)) == [["small"], ["x" * (MAX_BATCH_BYTES + 1)], ["small again"]]
+
+def test_empty_input_yields_no_batches():
+    assert list(pack_batches([])) == []
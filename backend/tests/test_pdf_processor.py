@@ -0,0 +1,84 @@
+import asyncio
+import pytest
+
+pytest.importorskip("fitz")
+from langchain_core.documents import Document
+from backend.src.infrastructure.document_processing.pdf_processor import (
+    MIN_CHUNK_TOKENS,
+    LangChainDocumentProcessor,
+    _dedupe_texts,
+)
+
+class FakeEmbeddings:
+    """Embeds each text as [len(text)] and records the batches it was sent."""
+
+    def __init__(self):
+        self.batches = []
+
+    def embed_documents(self, texts):
+        self.batches.append(list(texts))
+        return [[float(len(text))] for text in texts]
+
+    async def aembed_documents(self, texts):
+        return self.embed_documents(texts)
+
+class WordTokenizer:
+    """Counts whitespace-separated words as tokens."""
+
+    def encode(self, text):
+        return text.split()
+
+def _processor(chunk_size=1000):
+    # Skip __init__, which needs a Gemini API key
+    processor = LangChainDocumentProcessor.__new__(LangChainDocumentProcessor)
+    processor.embeddings = FakeEmbeddings()
+    processor.tokenizer = WordTokenizer()
+    processor.chunk_size = chunk_size
+    return processor
+
+def _chunk(words, page):
+    return Document(page_content=" ".join(["word"] * words), metadata={"page": page})
+
+def test_dedupe_texts_maps_back_to_original_positions():
+    texts = ["header", "body one", "header", "footer", "body two", "footer"]
+    unique_texts, index_map = _dedupe_texts(texts)
+
+    assert unique_texts == ["header", "body one", "footer", "body two"]
+    assert [unique_texts[position] for position in index_map] == texts
+
+def test_generate_embeddings_embeds_duplicates_once():
+    texts = ["a", "bb", "a", "ccc", "bb"]
+    processor = _processor()
+    embeddings = processor.generate_embeddings([Document(page_content=text) for text in texts], batch_size=2)
+
+    assert processor.embeddings.batches == [["a", "bb"], ["ccc"]]
+    assert embeddings == [[float(len(text))] for text in texts]
+
+def test_agenerate_embeddings_keeps_document_order():
+    texts = ["a", "bb", "a", "ccc", "bb", "dddd"]
+    processor = _processor()
+    embeddings = asyncio.run(processor.agenerate_embeddings([Document(page_content=text) for text in texts], batch_size=2))
+
+    assert sorted(text for batch in processor.embeddings.batches for text in batch) == ["a", "bb", "ccc", "dddd"]
+    assert embeddings == [[float(len(text))] for text in texts]
+
+def test_merge_small_chunks_within_a_page():
+    chunks = [_chunk(200, page=0), _chunk(10, page=0), _chunk(200, page=1)]
+    merged, token_counts = _processor()._merge_small_chunks(chunks)
+
+    assert [chunk.metadata["page"] for chunk in merged] == [0, 1]
+    assert token_counts == [210, 200]
+
+def test_merge_small_chunks_keeps_page_boundaries():
+    # A short chunk at the top of a page must not be credited to the previous page
+    chunks = [_chunk(200, page=0), _chunk(MIN_CHUNK_TOKENS - 1, page=1), _chunk(5, page=2)]
+    merged, token_counts = _processor()._merge_small_chunks(chunks)
+
+    assert [chunk.metadata["page"] for chunk in merged] == [0, 1, 2]
+    assert token_counts == [200, MIN_CHUNK_TOKENS - 1, 5]
+
+def test_merge_small_chunks_respects_chunk_size():
+    chunks = [_chunk(95, page=0), _chunk(10, page=0)]
+    merged, token_counts = _processor(chunk_size=100)._merge_small_chunks(chunks)
+
+    assert token_counts == [95, 10]
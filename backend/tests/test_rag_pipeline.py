@@ -61,7 +61,7 @@ def test_document_processing():
             print(f"\nTesting query: {query}")
             response = requests.post(
                 f"{API_BASE_URL}/query_document/",
-                json={"query": query}
+                json={"query": query, "include_chunks": True}
             )
             
             if response.status_code != 200:
@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+from backend.src.infrastructure.cache.semantic_cache import SemanticCache, quantize_int8
+
+def _unit(*values):
+    v = np.asarray(values, dtype=np.float32)
+    return v / np.linalg.norm(v)
+
+def test_semantic_cache_hit_and_miss():
+    cache = SemanticCache(threshold=0.97, max_size=10)
+    cache.add(_unit(1, 0, 0), {"answer": "a"}, "doc.pdf")
+
+    assert cache.lookup(_unit(1, 0.01, 0), "doc.pdf") == {"answer": "a"}
+    assert cache.lookup(_unit(0, 1, 0), "doc.pdf") is None
+    # Entries are scoped per file title
+    assert cache.lookup(_unit(1, 0, 0), "other.pdf") is None
+    assert cache.lookup(_unit(1, 0, 0), None) is None
+
+def test_semantic_cache_evicts_least_recently_used():
+    cache = SemanticCache(threshold=0.97, max_size=2)
+    cache.add(_unit(1, 0, 0), {"answer": "x"})
+    cache.add(_unit(0, 1, 0), {"answer": "y"})
+
+    # Touch "x" so "y" becomes the eviction candidate
+    assert cache.lookup(_unit(1, 0, 0)) == {"answer": "x"}
+    cache.add(_unit(0, 0, 1), {"answer": "z"})
+
+    assert len(cache) == 2
+    assert cache.lookup(_unit(0, 1, 0)) is None
+    assert cache.lookup(_unit(1, 0, 0)) == {"answer": "x"}
+    assert cache.lookup(_unit(0, 0, 1)) == {"answer": "z"}
+
+def test_semantic_cache_invalidate_by_file_title():
+    cache = SemanticCache(threshold=0.97, max_size=10)
+    cache.add(_unit(1, 0, 0), {"answer": "a"}, "doc.pdf")
+    cache.add(_unit(0, 1, 0), {"answer": "b"}, "other.pdf")
+
+    assert cache.invalidate("doc.pdf") == 1
+    assert cache.lookup(_unit(1, 0, 0), "doc.pdf") is None
+    assert cache.lookup(_unit(0, 1, 0), "other.pdf") == {"answer": "b"}
+
+def test_int8_quantization_preserves_cosine_similarity():
+    rng = np.random.default_rng(0)
+    a = rng.normal(size=(50, 768)).astype(np.float32)
+    b = a + rng.normal(scale=0.15, size=a.shape).astype(np.float32)
+
+    def cosine(x, y):
+        return (x * y).sum(axis=1) / (np.linalg.norm(x, axis=1) * np.linalg.norm(y, axis=1))
+
+    exact = cosine(a, b)
+    quantized = cosine(quantize_int8(a).astype(np.float32), quantize_int8(b).astype(np.float32))
+    assert np.abs(exact - quantized).max() < 1e-3
+
+def test_semantic_cache_hnsw_index():
+    pytest.importorskip("hnswlib")
+    cache = SemanticCache(threshold=0.97, max_size=3, ann_threshold=2)
+    cache.add(_unit(1, 0, 0), {"answer": "a"}, "doc.pdf")
+    cache.add(_unit(0, 1, 0), {"answer": "b"}, "other.pdf")
+    assert cache._index is not None
+
+    assert cache.lookup(_unit(1, 0.01, 0), "doc.pdf") == {"answer": "a"}
+    assert cache.lookup(_unit(1, 0, 0), "other.pdf") is None
+    assert cache.lookup(_unit(0, 0, 1), None) is None
+
+    # Evictions ("b" is least recently used) and invalidations are reflected in the index
+    cache.add(_unit(0, 0, 1), {"answer": "c"})
+    cache.add(_unit(1, 1, 0), {"answer": "d"})
+    assert cache.lookup(_unit(0, 1, 0), "other.pdf") is None
+    assert cache.invalidate("doc.pdf") == 1
+    assert cache.lookup(_unit(1, 0, 0), "doc.pdf") is None
+    assert cache.lookup(_unit(1, 1, 0)) == {"answer": "d"}
@@ -0,0 +1,74 @@
+import asyncio
+import time
+from types import SimpleNamespace
+import pytest
+from backend.src.infrastructure.uploads import session_store
+from backend.src.infrastructure.uploads.session_store import RedisUploadSessionStore, UploadSessionStore
+
+def _session(expires_in=3600):
+    return {"filename": "doc.pdf", "total_chunks": 3, "temp_dir": "/tmp/upload", "expires_at": time.time() + expires_in}
+
+def _redis_store(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    monkeypatch.setattr(session_store, "aioredis", SimpleNamespace(
+        from_url=lambda url, **kwargs: fakeredis.aioredis.FakeRedis(**kwargs)
+    ))
+    return RedisUploadSessionStore("redis://localhost:6379/0")
+
+@pytest.fixture(params=["memory", "redis"])
+def store(request, monkeypatch):
+    if request.param == "memory":
+        return UploadSessionStore()
+    return _redis_store(monkeypatch)
+
+def test_session_round_trip(store):
+    async def run():
+        await store.create("u1", _session())
+        session = await store.get("u1")
+        assert session["filename"] == "doc.pdf"
+        assert session["chunks_received"] == 0
+        assert session["is_complete"] is False
+        assert await store.get("missing") is None
+    asyncio.run(run())
+
+def test_resent_chunks_are_counted_once(store):
+    async def run():
+        await store.create("u1", _session())
+        # Chunks may arrive out of order and be retried
+        assert await store.record_chunk("u1", 2) == 1
+        assert await store.record_chunk("u1", 0) == 2
+        assert await store.record_chunk("u1", 2) == 2
+        assert await store.record_chunk("u1", 1) == 3
+        assert (await store.get("u1"))["chunks_received"] == 3
+    asyncio.run(run())
+
+def test_mark_complete_only_succeeds_once(store):
+    async def run():
+        await store.create("u1", _session())
+        assert await store.mark_complete("u1") is True
+        assert await store.mark_complete("u1") is False
+        assert (await store.get("u1"))["is_complete"] is True
+        assert await store.mark_complete("missing") is False
+    asyncio.run(run())
+
+def test_delete_removes_session(store):
+    async def run():
+        await store.create("u1", _session())
+        await store.record_chunk("u1", 0)
+        await store.delete("u1")
+        assert await store.get("u1") is None
+    asyncio.run(run())
+
+def test_pop_expired_returns_only_expired_sessions(store):
+    async def run():
+        await store.create("old", _session(expires_in=-10))
+        await store.create("new", _session())
+
+        removed = await store.pop_expired()
+        assert [session["upload_id"] for session in removed] == ["old"]
+        assert removed[0]["temp_dir"] == "/tmp/upload"
+        assert await store.get("old") is None
+        assert await store.get("new") is not None
+        # A second reaper finds nothing left to clean up
+        assert await store.pop_expired() == []
+    asyncio.run(run())
@@ -142,15 +142,19 @@ const uploadChunkWithRetry = async (
   uploadId: string,
   chunkIndex: number,
   totalChunks: number,
-  chunkData: string,
+  chunkData: ArrayBuffer,
   retryCount = 0
 ): Promise<any> => {
   try {
-    return await api.post('/api/documents/upload_chunk/', {
-      upload_id: uploadId,
-      chunk_index: chunkIndex,
-      total_chunks: totalChunks,
-      chunk_data: chunkData
+    // Send the raw bytes; the binary endpoint avoids base64's size and decode overhead
+    return await api.post('/api/documents/upload_chunk_binary/', chunkData, {
+      params: {
+        upload_id: uploadId,
+        chunk_index: chunkIndex
+      },
+      headers: {
+        'Content-Type': 'application/octet-stream'
+      }
     });
   } catch (error: any) {
     // If we haven't exceeded max retries, try again
@@ -201,7 +205,8 @@ const uploadChunkedFile = async (
       file_name: filename,
       total_chunks: totalChunks,
       total_size: file.size,
-      mime_type: file.type
+      mime_type: file.type,
+      chunk_size: CHUNK_SIZE
     });
     
     const uploadId = initResponse.data.upload_id;
@@ -227,9 +232,8 @@ const uploadChunkedFile = async (
         });
       }
       
-      // Read chunk as ArrayBuffer and convert to Base64
+      // Read chunk as ArrayBuffer
       const arrayBuffer = await chunk.arrayBuffer();
-      const base64Chunk = arrayBufferToBase64(arrayBuffer);
       
       // Upload chunk with retry logic
       console.log(`Uploading chunk ${chunkIndex + 1}/${totalChunks}`);
@@ -238,7 +242,7 @@ const uploadChunkedFile = async (
           uploadId,
           chunkIndex,
           totalChunks,
-          base64Chunk
+          arrayBuffer
         );
         
         // Update progress
@@ -296,16 +300,6 @@ const uploadChunkedFile = async (
   }
 };
 
-// Helper function to convert ArrayBuffer to Base64
-function arrayBufferToBase64(buffer: ArrayBuffer): string {
-  const binary = new Uint8Array(buffer);
-  let binaryString = '';
-  for (let i = 0; i < binary.byteLength; i++) {
-    binaryString += String.fromCharCode(binary[i]);
-  }
-  return btoa(binaryString);
-}
-
 // Main upload function that chooses the appropriate method based on file size
 export const uploadDocument = async (
   file: File, 
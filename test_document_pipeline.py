@@ -66,10 +66,10 @@ def run_pipeline_test():
     logger.info(f"Chunk Size: {chunk_size_from_settings}")
     logger.info(f"GCP Destination Folder: {gcp_destination_folder_from_settings}")
 
+    # The PDF is parsed and uploaded straight from disk rather than read into memory
     try:
-        with open(pdf_file_path, "rb") as f:
-            pdf_buffer = f.read()
-        logger.info(f"Successfully read {len(pdf_buffer)} bytes from {pdf_file_path}")
+        pdf_size = os.path.getsize(pdf_file_path)
+        logger.info(f"Found {pdf_size} bytes at {pdf_file_path}")
     except FileNotFoundError:
         logger.error(f"Test PDF not found at: {pdf_file_path}")
         return
@@ -81,7 +81,8 @@ def run_pipeline_test():
     try:
         logger.info("Calling process_document...")
         result = process_document(
-            buffer=pdf_buffer,
+            buffer=None,
+            pdf_path=pdf_file_path,
             original_name=original_filename,
             files_table_name=files_metadata_table,
             supabase_url=supabase_url_from_env, # Pass directly